@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import instrumentation, metrics, query_log
+        instrumentation.add_listener(metrics.record)
+        if settings.SLOW_QUERY_THRESHOLD:
+            connection_created.connect(query_log.install)
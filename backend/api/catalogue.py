@@ -0,0 +1,165 @@
+"""Снимок справочника ингредиентов.
+
+Полный список ингредиентов меняется редко, а фронтенд загружает его
+целиком и фильтрует сам. Список заранее сериализуется тем же
+сериализатором и рендерером, что и ответ API, и сохраняется вместе со
+сжатыми gzip и brotli вариантами в INGREDIENT_SNAPSHOT_DIR. Имена файлов
+содержат SHA-256 содержимого, а файл current — хэш текущего снимка,
+который заменяется последним; поэтому читатель всегда видит целый
+снимок. Хэш служит и ETag ответа.
+
+Снимок пересобирает команда load_ingredients и фоновая задача после
+изменения ингредиентов в админке. Ответ отдаётся из памяти процесса без
+обращения к базе или, с INGREDIENT_SNAPSHOT_ACCEL, передаётся nginx
+через X-Accel-Redirect.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from jobs.tasks import task
+from recipes.models import Ingredient
+
+from .middleware import accepted_encoding, brotli
+from .renderers import FastJSONRenderer
+from .serializers import IngredientSerializer
+
+CURRENT = 'current'
+PREFIX = 'ingredients.'
+SUFFIXES = {None: '', 'gzip': '.gz', 'br': '.br'}
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    digest: str
+    variants: dict
+
+    def filename(self, encoding=None):
+        return f'{PREFIX}{self.digest}.json{SUFFIXES[encoding]}'
+
+    def etag(self, encoding=None):
+        # Сжатые варианты отличаются байтами, но не содержимым.
+        return f'W/"{self.digest}"' if encoding else f'"{self.digest}"'
+
+
+_loaded = None
+
+
+def _write(path, content):
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(
+        dir=directory, prefix='.', delete=False
+    ) as file:
+        file.write(content)
+    # mkstemp создаёт файл только для владельца, а читает его и nginx.
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def _read_digest(directory):
+    try:
+        with open(os.path.join(directory, CURRENT)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _prune(directory, keep):
+    """Удаляет файлы снимков, кроме перечисленных в keep.
+
+    Предыдущий снимок остаётся: процесс мог прочитать его хэш до замены
+    current и ещё не дочитать файлы.
+    """
+    names = {
+        Snapshot(digest, {}).filename(encoding)
+        for digest in keep if digest
+        for encoding in SUFFIXES
+    }
+    for entry in os.scandir(directory):
+        if entry.name.startswith(PREFIX) and entry.name not in names:
+            os.remove(entry.path)
+
+
+@task
+def build_snapshot():
+    """Собирает снимок справочника из базы и делает его текущим."""
+    content = FastJSONRenderer().render(
+        IngredientSerializer(Ingredient.objects.all(), many=True).data
+    )
+    variants = {None: content, 'gzip': gzip.compress(content, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    snapshot = Snapshot(hashlib.sha256(content).hexdigest(), variants)
+
+    directory = settings.INGREDIENT_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_digest(directory)
+    for encoding, data in variants.items():
+        _write(os.path.join(directory, snapshot.filename(encoding)), data)
+    _write(os.path.join(directory, CURRENT), snapshot.digest.encode())
+    _prune(directory, (previous, snapshot.digest))
+    return snapshot
+
+
+def load():
+    """Текущий снимок или None, если он ещё не собран.
+
+    Снимок читается с диска один раз и перечитывается, только когда
+    заменён файл current.
+    """
+    global _loaded
+    directory = settings.INGREDIENT_SNAPSHOT_DIR
+    try:
+        stat = os.stat(os.path.join(directory, CURRENT))
+    except FileNotFoundError:
+        return None
+    version = (directory, stat.st_ino, stat.st_mtime_ns)
+    if _loaded is not None and _loaded[0] == version:
+        return _loaded[1]
+    digest = _read_digest(directory)
+    if digest is None:
+        return None
+    snapshot = Snapshot(digest, {})
+    for encoding in SUFFIXES:
+        try:
+            with open(
+                os.path.join(directory, snapshot.filename(encoding)), 'rb'
+            ) as file:
+                snapshot.variants[encoding] = file.read()
+        except FileNotFoundError:
+            if encoding is None:
+                return None
+    _loaded = (version, snapshot)
+    return snapshot
+
+
+def response(request, snapshot):
+    """Ответ со снимком в лучшем из принимаемых клиентом сжатий.
+
+    На If-None-Match ответ 304 даёт ConditionalGetMiddleware по ETag.
+    """
+    if settings.INGREDIENT_SNAPSHOT_ACCEL:
+        # Сжатие и условные запросы берёт на себя nginx (gzip_static).
+        result = HttpResponse(content_type='application/json')
+        result['X-Accel-Redirect'] = (
+            settings.INGREDIENT_SNAPSHOT_ACCEL + snapshot.filename()
+        )
+        return result
+    encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding not in snapshot.variants:
+        encoding = None
+    result = HttpResponse(
+        snapshot.variants[encoding], content_type='application/json'
+    )
+    if encoding:
+        result['Content-Encoding'] = encoding
+    result['ETag'] = snapshot.etag(encoding)
+    patch_vary_headers(result, ('Accept-Encoding',))
+    patch_cache_control(result, no_cache=True)
+    return result
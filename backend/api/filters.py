@@ -5,6 +5,7 @@ from django_filters.rest_framework import (
 )
 
 from recipes.models import Ingredient, Recipe, User
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -18,6 +19,7 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = CharFilter(method='filter_search')
 
     def filter_is_favorited(self, recipes, name, value):
         user = self.request.user
@@ -35,9 +37,12 @@ class RecipeFilter(FilterSet):
             return recipes.exclude(shoppingcart__user=user)
         return recipes
 
+    def filter_search(self, recipes, name, value):
+        return search_recipes(recipes, value)
+
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart', 'search')
 
 
 class IngredientFilter(FilterSet):
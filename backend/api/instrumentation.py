@@ -0,0 +1,74 @@
+"""Метрики приложения.
+
+Значения пишутся в лог foodgram.metrics на уровне DEBUG и передаются
+подключённым получателям: получатель — функция вида
+listener(kind, name, value, labels), где kind — 'counter' или
+'observation'.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+logger = logging.getLogger('foodgram.metrics')
+
+_listeners = []
+
+# Запрос, который сейчас обрабатывается; задаёт MetricsMiddleware
+current_request = ContextVar('current_request', default=None)
+
+
+def add_listener(listener):
+    """Подключает получателя метрик."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _emit(kind, name, value, labels):
+    logger.debug('%s %s=%s %s', kind, name, value, labels)
+    for listener in _listeners:
+        try:
+            listener(kind, name, value, labels)
+        except Exception:
+            logger.exception('Ошибка получателя метрик %r', listener)
+
+
+def increment(name, value=1, **labels):
+    """Увеличивает счётчик."""
+    _emit('counter', name, value, labels)
+
+
+def observe(name, value, **labels):
+    """Записывает наблюдение: время, размер, долю."""
+    _emit('observation', name, value, labels)
+
+
+def view_labels(request):
+    """Представление и действие ViewSet, обработавшие запрос.
+
+    Для запросов, не дошедших до представления, возвращает (None, None).
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None, None
+    view = getattr(match.func, 'cls', match.func)
+    actions = getattr(match.func, 'actions', None) or {}
+    return (
+        f'{view.__module__}.{view.__qualname__}',
+        actions.get(request.method.lower())
+    )
+
+
+class QueryCounter:
+    """Считает запросы к базе и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - started
@@ -0,0 +1,110 @@
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# То, что процесс gunicorn импортирует до первого ответа: приложение WSGI
+# и URLconf со всеми представлениями.
+BOOT = (
+    'import os\n'
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', "
+    "'foodgram_back.settings')\n"
+    'from foodgram_back.wsgi import application\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+# Модули, которые нужны редким запросам и командам и должны загружаться
+# только при обращении к ним.
+LAZY_MODULES = (
+    'PIL',
+    'numpy',
+    'scipy',
+    'recipes.recommendations',
+)
+
+
+def parse_importtime(output):
+    """Строки -X importtime: (модуль, собственное, общее время в мкс)."""
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        yield name.strip(), int(own), int(cumulative), (
+            len(name) - len(name.lstrip()) == 1
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет через python -X importtime импорт при запуске процесса '
+        'gunicorn; падает, если превышен IMPORT_TIME_BUDGET или при '
+        'запуске загружаются модули из LAZY_MODULES'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='число запусков; берётся самый быстрый'
+        )
+        parser.add_argument(
+            '--budget', type=int,
+            help='бюджет в миллисекундах, по умолчанию IMPORT_TIME_BUDGET'
+        )
+        parser.add_argument('--limit', type=int, default=15)
+
+    def handle(self, *args, **options):
+        budget = options['budget'] or settings.IMPORT_TIME_BUDGET
+        runs = [self._measure() for _ in range(max(options['runs'], 1))]
+        modules = min(
+            runs,
+            key=lambda run: sum(
+                cumulative for _, _, cumulative, top in run if top
+            )
+        )
+        total = sum(cumulative for _, _, cumulative, top in modules if top)
+
+        packages = Counter()
+        for name, own, _, _ in modules:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(
+            f'Модулей: {len(modules)}, импорт: {total / 1000:.0f} мс '
+            f'(бюджет {budget} мс). Собственное время по пакетам:'
+        )
+        for package, own in packages.most_common(options['limit']):
+            self.stdout.write(f'{own / 1000:8.1f} мс  {package}')
+
+        loaded = {name for name, _, _, _ in modules}
+        eager = [
+            module for module in LAZY_MODULES
+            if any(
+                name == module or name.startswith(module + '.')
+                for name in loaded
+            )
+        ]
+        errors = []
+        if eager:
+            errors.append(
+                f'при запуске загружаются {", ".join(eager)}'
+            )
+        if total > budget * 1000:
+            errors.append(
+                f'импорт {total / 1000:.0f} мс больше бюджета {budget} мс'
+            )
+        if errors:
+            raise CommandError('; '.join(errors) + '.')
+        self.stdout.write(self.style.SUCCESS('Импорт в пределах бюджета.'))
+
+    def _measure(self):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(
+                f'Приложение не запустилось:\n{result.stderr[-2000:]}'
+            )
+        return list(parse_importtime(result.stderr))
@@ -0,0 +1,107 @@
+import io
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Профили запросов: list — список, show ID — сводка профиля, '
+        'token — значение заголовка X-Profile, clear — удалить все'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action', nargs='?', default='list',
+            choices=('list', 'show', 'token', 'clear')
+        )
+        parser.add_argument('profile_id', nargs='?')
+        parser.add_argument(
+            '--limit', type=int, default=25,
+            help='число строк в сводке профиля'
+        )
+        parser.add_argument(
+            '--sort', default='cumulative',
+            help='порядок статистики pstats: cumulative, tottime, calls'
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'token':
+            self.stdout.write(profiling.make_token())
+        elif action == 'clear':
+            profiles = profiling.list_profiles()
+            for meta in profiles:
+                profiling.delete_profile(meta['id'])
+            self.stdout.write(f'Удалено профилей: {len(profiles)}')
+        elif action == 'show':
+            self._show(options)
+        else:
+            self._list()
+
+    def _list(self):
+        profiles = profiling.list_profiles()
+        if not profiles:
+            self.stdout.write('Профилей нет.')
+            return
+        for meta in profiles:
+            view = meta['view'] or '-'
+            if meta['action']:
+                view = f'{view}.{meta["action"]}'
+            self.stdout.write(
+                f'{meta["id"]}  {meta["status"]}  '
+                f'{meta["duration"] * 1000:8.1f} мс  '
+                f'{meta["queries"]:4} SQL  {meta["method"]} '
+                f'{meta["path"]}  {view}'
+            )
+
+    def _show(self, options):
+        profile_id = options['profile_id']
+        meta = next(
+            (
+                meta for meta in profiling.list_profiles()
+                if profile_id and meta['id'].startswith(profile_id)
+            ),
+            None
+        )
+        if meta is None:
+            raise CommandError(f'Профиль {profile_id} не найден.')
+        self.stdout.write(
+            f'{meta["method"]} {meta["path"]} → {meta["status"]}\n'
+            f'Представление: {meta["view"]}, действие: {meta["action"]}\n'
+            f'Время: {meta["duration"] * 1000:.1f} мс, запросов к базе: '
+            f'{meta["queries"]} ({meta["query_time"] * 1000:.1f} мс)'
+        )
+        for name in meta['files']:
+            path = profiling.profile_path(name, '')
+            if name.endswith(profiling.STATS_SUFFIX):
+                output = io.StringIO()
+                stats = pstats.Stats(path, stream=output)
+                stats.strip_dirs().sort_stats(options['sort']).print_stats(
+                    options['limit']
+                )
+                self.stdout.write(output.getvalue())
+            elif name.endswith(profiling.STACKS_SUFFIX):
+                self._show_stacks(path, meta['samples'], options['limit'])
+
+    def _show_stacks(self, path, samples, limit):
+        """Функции, чаще всего оказывавшиеся на вершине стека."""
+        if not samples:
+            self.stdout.write(
+                f'\n{path}\nСэмплов нет: запрос короче интервала '
+                f'сэмплирования.'
+            )
+            return
+        own = Counter()
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                own[stack.rsplit(';', 1)[-1]] += int(count)
+        self.stdout.write(
+            f'\n{path}\nСэмплов: {samples}. Собственное время функций:'
+        )
+        for function, count in own.most_common(limit):
+            self.stdout.write(f'{count / samples:7.1%}  {function}')
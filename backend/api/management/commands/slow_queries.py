@@ -0,0 +1,135 @@
+import json
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.query_log import LOG_PREFIX, normalize
+
+SORT_KEYS = {
+    'total': lambda group: group['total'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max'],
+    'mean': lambda group: group['total'] / group['count'],
+}
+
+
+def read_entries(lines):
+    """Записи журнала из строк лога; прочие строки пропускаются."""
+    for line in lines:
+        position = line.find(LOG_PREFIX + '{')
+        if position == -1:
+            continue
+        try:
+            yield json.loads(line[position + len(LOG_PREFIX):])
+        except ValueError:
+            continue
+
+
+def plan_summary(plan, depth=0):
+    """Узлы плана EXPLAIN (FORMAT JSON) с оценками стоимости и строк."""
+    node = plan
+    yield (
+        f'{"  " * depth}{node["Node Type"]}'
+        + (f' on {node["Relation Name"]}' if 'Relation Name' in node else '')
+        + f' (cost={node["Total Cost"]} rows={node["Plan Rows"]})'
+    )
+    for child in node.get('Plans', ()):
+        yield from plan_summary(child, depth + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов по видам запросов: число, '
+        'суммарное и максимальное время, представления и план'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='файлы журнала, «-» — стандартный ввод; по умолчанию '
+                 'SLOW_QUERY_LOG'
+        )
+        parser.add_argument(
+            '--sort', choices=tuple(SORT_KEYS), default='total'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='показать дерево плана для запросов, у которых он снят'
+        )
+
+    def handle(self, *args, **options):
+        files = options['files'] or [settings.SLOW_QUERY_LOG]
+        if not any(files):
+            raise CommandError(
+                'SLOW_QUERY_LOG не задан: укажите файл журнала или «-».'
+            )
+        groups = {}
+        for path in files:
+            if path == '-':
+                self._collect(groups, sys.stdin)
+                continue
+            try:
+                with open(path, encoding='utf-8') as file:
+                    self._collect(groups, file)
+            except OSError as error:
+                raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        ordered = sorted(
+            groups.values(), key=SORT_KEYS[options['sort']], reverse=True
+        )
+        for group in ordered[:options['limit']]:
+            views = ', '.join(
+                f'{view} ×{count}'
+                for view, count in group['views'].most_common(3)
+            )
+            self.stdout.write(self.style.WARNING(
+                f'{group["count"]} раз, всего {group["total"]:.0f} мс, '
+                f'в среднем {group["total"] / group["count"]:.1f} мс, '
+                f'максимум {group["max"]:.1f} мс'
+            ))
+            self.stdout.write(f'  {group["normalized"]}')
+            self.stdout.write(f'  Откуда: {views}')
+            if group['stack']:
+                self.stdout.write(f'  Стек: {group["stack"][-1]}')
+            if group['plan'] is not None:
+                if 'error' in group['plan']:
+                    self.stdout.write(
+                        f'  План не снят: {group["plan"]["error"]}'
+                    )
+                elif options['plans']:
+                    for line in plan_summary(group['plan'][0]['Plan']):
+                        self.stdout.write(f'    {line}')
+                else:
+                    self.stdout.write(
+                        '  План: '
+                        + next(plan_summary(group['plan'][0]['Plan']))
+                    )
+            self.stdout.write('')
+
+    def _collect(self, groups, lines):
+        for entry in read_entries(lines):
+            normalized = normalize(entry['sql'])
+            group = groups.setdefault(normalized, {
+                'normalized': normalized,
+                'count': 0,
+                'total': 0.0,
+                'max': 0.0,
+                'views': Counter(),
+                'stack': entry.get('stack'),
+                'plan': None,
+            })
+            group['count'] += 1
+            group['total'] += entry['duration_ms']
+            group['max'] = max(group['max'], entry['duration_ms'])
+            view = entry.get('view') or '-'
+            if entry.get('action'):
+                view = f'{view}.{entry["action"]}'
+            group['views'][view] += 1
+            if entry.get('explain'):
+                group['plan'] = entry['explain']
@@ -0,0 +1,86 @@
+"""Метрики в формате Prometheus.
+
+Получатель record подключается к api.instrumentation при запуске
+приложения: счётчики становятся Counter, наблюдения — Histogram с
+границами по суффиксу имени. Метрики создаются при первом значении;
+набор меток метрики задаётся этим значением.
+
+Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR, значения
+всех процессов gunicorn пишутся в файлы этого каталога и собираются
+вместе при каждом запросе /api/metrics; каталог нужно очищать перед
+запуском сервера (start.sh), а файлы завершившихся процессов помечает
+хук child_exit в gunicorn.conf.py.
+"""
+import os
+import threading
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+PREFIX = 'foodgram_'
+BUCKETS = {
+    '_seconds': (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+    ),
+    '_bytes': tuple(2 ** power for power in range(10, 25, 2)),
+    '_ratio': (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1),
+    '': (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+}
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _buckets(name):
+    return next(
+        buckets for suffix, buckets in BUCKETS.items()
+        if name.endswith(suffix)
+    )
+
+
+def _metric(kind, name, labelnames):
+    metric = _metrics.get(name)
+    if metric is None:
+        with _lock:
+            metric = _metrics.get(name)
+            if metric is None:
+                if kind == 'counter':
+                    metric = Counter(PREFIX + name, name, labelnames)
+                else:
+                    metric = Histogram(
+                        PREFIX + name, name, labelnames,
+                        buckets=_buckets(name)
+                    )
+                _metrics[name] = metric
+    return metric
+
+
+def record(kind, name, value, labels):
+    """Получатель метрик для api.instrumentation."""
+    metric = _metric(kind, name, tuple(sorted(labels)))
+    if labels:
+        metric = metric.labels(**{
+            key: '' if label is None else label
+            for key, label in labels.items()
+        })
+    if kind == 'counter':
+        metric.inc(value)
+    else:
+        metric.observe(value)
+
+
+def render():
+    """Текущие значения в текстовом формате Prometheus."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -0,0 +1,179 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+from . import instrumentation, profiling
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSED_CACHE_KEY = 'api:compressed:{}:{}'
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+BROTLI_QUALITY = 5
+
+
+def _gzip(content):
+    return compress_string(content, max_random_bytes=100)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=BROTLI_QUALITY)
+
+
+ENCODERS = {'gzip': _gzip}
+if brotli is not None:
+    ENCODERS = {'br': _brotli, **ENCODERS}
+
+
+def accepted_encoding(header):
+    """Лучшее из поддерживаемых сжатий по заголовку Accept-Encoding."""
+    weights = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in ENCODERS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы API больше COMPRESSION_MIN_SIZE байт.
+
+    Сжимаются только успешные ответы на GET и HEAD: ответы на запись
+    могут содержать токены. Сжатые байты ответов с ETag на запросы без
+    авторизации, то есть общих для всех клиентов, кэшируются по ETag и
+    не пересчитываются при каждом обращении.
+    """
+
+    def process_response(self, request, response):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or response.status_code != 200
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(
+                COMPRESSIBLE_TYPES
+            )
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+
+        content = response.content
+        etag = response.get('ETag')
+        cache_key = None
+        compressed = None
+        if etag and 'HTTP_AUTHORIZATION' not in request.META:
+            cache_key = COMPRESSED_CACHE_KEY.format(
+                encoding, hashlib.md5(etag.encode()).hexdigest()
+            )
+            compressed = cache.get(cache_key)
+        if cache_key is not None:
+            instrumentation.increment(
+                'cache_requests', cache='compressed_response',
+                result='miss' if compressed is None else 'hit'
+            )
+        if compressed is None:
+            started = time.perf_counter()
+            compressed = ENCODERS[encoding](content)
+            instrumentation.observe(
+                'compression_seconds', time.perf_counter() - started,
+                encoding=encoding
+            )
+            if cache_key is not None:
+                cache.set(
+                    cache_key, compressed, settings.COMPRESSION_CACHE_TIMEOUT
+                )
+        instrumentation.observe(
+            'compression_ratio', len(compressed) / len(content),
+            encoding=encoding
+        )
+        if len(compressed) >= len(content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class MetricsMiddleware:
+    """Время ответа и запросы к базе по представлениям и статусам."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = instrumentation.QueryCounter()
+        token = instrumentation.current_request.set(request)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            instrumentation.current_request.reset(token)
+        duration = time.perf_counter() - started
+        view, action = instrumentation.view_labels(request)
+        instrumentation.observe(
+            'http_request_duration_seconds', duration,
+            view=view, action=action, method=request.method,
+            status=response.status_code
+        )
+        instrumentation.observe(
+            'db_queries_per_request', queries.count,
+            view=view, action=action
+        )
+        instrumentation.observe(
+            'db_query_duration_seconds', queries.time,
+            view=view, action=action
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запросы с заголовком X-Profile (api/profiling.py).
+
+    Запросы без заголовка проходят после одной проверки словаря;
+    при пустом PROFILING_DIR промежуточный слой отключается совсем.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        value = request.META.get('HTTP_X_PROFILE')
+        if value is None or not profiling.should_profile(request, value):
+            return self.get_response(request)
+        mode = request.META.get('HTTP_X_PROFILE_MODE', 'all')
+        if mode not in profiling.MODES:
+            mode = 'all'
+        return profiling.profile_request(request, self.get_response, mode)
@@ -1,4 +1,11 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class FoodgramPageNumberPagination(PageNumberPagination):
@@ -6,3 +13,49 @@ class FoodgramPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 100
+
+
+class KeysetPagination(FoodgramPageNumberPagination):
+    """Пагинация по ключу (дата публикации, id).
+
+    Стоимость страницы не зависит от её номера: курсор хранит позицию
+    последнего показанного элемента.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            pub_date, object_id = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            position = parse_datetime(pub_date), int(object_id)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        pub_date, object_id = position
+        return urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{object_id}'.encode()
+        ).decode()
+
+    def get_next_link(self, request, position):
+        if position is None:
+            return None
+        return replace_query_param(
+            request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(position)
+        )
+
+    def get_keyset_response(self, request, data, next_position):
+        return Response({
+            'next': self.get_next_link(request, next_position),
+            'results': data,
+        })
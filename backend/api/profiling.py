@@ -0,0 +1,238 @@
+"""Профилирование отдельных запросов по требованию.
+
+Запрос профилируется, если в заголовке X-Profile передан подписанный
+токен (см. make_token и команду profiles) или если его отправил
+сотрудник с токеном авторизации и X-Profile: 1. Запрос выполняется под
+cProfile и под сэмплирующим профилировщиком; результат сохраняется в
+PROFILING_DIR: статистика в формате pstats, стеки в свёрнутом формате
+для flame graph (flamegraph.pl, speedscope) и описание в JSON. Хранится
+не больше PROFILING_MAX_PROFILES последних профилей.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import instrumentation
+
+TOKEN_SALT = 'api.profiling'
+MODES = ('all', 'cprofile', 'sample')
+STATS_SUFFIX = '.pstats'
+STACKS_SUFFIX = '.collapsed'
+META_SUFFIX = '.json'
+
+
+def make_token():
+    """Значение заголовка X-Profile, действующее PROFILING_TOKEN_MAX_AGE."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid4().hex)
+
+
+def _valid_token(value):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            value, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _staff_user(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            user, _ = TokenAuthentication().authenticate(request) or (
+                None, None
+            )
+        except AuthenticationFailed:
+            return None
+    if user is not None and user.is_staff:
+        return user
+    return None
+
+
+def should_profile(request, value):
+    """Решает, профилировать ли запрос с заголовком X-Profile."""
+    if value == '1':
+        return _staff_user(request) is not None
+    return _valid_token(value)
+
+
+class SamplingProfiler:
+    """Снимает стек потока запроса из отдельного потока раз в interval."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({_short_path(code.co_filename)}:'
+                    f'{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            # Стек после сигнала остановки — это уже сама остановка.
+            if stack and not self._stopped.is_set():
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+def _short_path(path):
+    """Путь к файлу без каталогов окружения: короче строки стеков."""
+    for root in sorted(sys.path, key=len, reverse=True):
+        if root and path.startswith(root + os.sep):
+            return path[len(root) + 1:]
+    return path
+
+
+def profile_request(request, get_response, mode):
+    """Выполняет запрос под профилировщиками и сохраняет профиль."""
+    profiler = sampler = None
+    if mode in ('all', 'cprofile'):
+        profiler = cProfile.Profile()
+    if mode in ('all', 'sample'):
+        sampler = SamplingProfiler(settings.PROFILING_SAMPLE_INTERVAL / 1000)
+    queries = instrumentation.QueryCounter()
+
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        stack.enter_context(connection.execute_wrapper(queries))
+        if sampler is not None:
+            sampler.start()
+            stack.callback(sampler.stop)
+        if profiler is not None:
+            profiler.enable()
+            stack.callback(profiler.disable)
+        response = get_response(request)
+    duration = time.perf_counter() - started
+
+    view, action = instrumentation.view_labels(request)
+    user = getattr(request, 'user', None)
+    profile_id = save_profile(
+        {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'action': action,
+            'status': response.status_code,
+            'duration': round(duration, 6),
+            'queries': queries.count,
+            'query_time': round(queries.time, 6),
+            'mode': mode,
+            'user': user.pk if user is not None and user.is_authenticated
+            else None,
+        },
+        profiler,
+        sampler,
+    )
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _write(path, write):
+    temporary = f'{path}.{uuid4().hex}.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def save_profile(meta, profiler=None, sampler=None):
+    """Сохраняет профиль и удаляет самые старые сверх лимита."""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    created = datetime.now(timezone.utc)
+    profile_id = f'{created:%Y%m%d-%H%M%S-%f}-{uuid4().hex[:4]}'
+    base = os.path.join(directory, profile_id)
+    files = []
+    if profiler is not None:
+        _write(base + STATS_SUFFIX, profiler.dump_stats)
+        files.append(profile_id + STATS_SUFFIX)
+    if sampler is not None:
+        def write_stacks(path):
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(sampler.collapsed())
+        _write(base + STACKS_SUFFIX, write_stacks)
+        files.append(profile_id + STACKS_SUFFIX)
+    meta = {
+        'id': profile_id,
+        'created_at': created.isoformat(timespec='seconds'),
+        **meta,
+        'samples': sum(sampler.stacks.values()) if sampler else None,
+        'files': files,
+    }
+
+    def write_meta(path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+    # Описание пишется последним: по нему профиль виден в списке.
+    _write(base + META_SUFFIX, write_meta)
+    _prune()
+    return profile_id
+
+
+def _prune():
+    for meta in list_profiles()[settings.PROFILING_MAX_PROFILES:]:
+        delete_profile(meta['id'])
+
+
+def list_profiles():
+    """Описания сохранённых профилей, новые первыми."""
+    try:
+        names = os.listdir(settings.PROFILING_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if not name.endswith(META_SUFFIX):
+            continue
+        try:
+            with open(
+                os.path.join(settings.PROFILING_DIR, name), encoding='utf-8'
+            ) as file:
+                profiles.append(json.load(file))
+        except (FileNotFoundError, ValueError):
+            # Профиль удалён другим процессом.
+            continue
+    return profiles
+
+
+def profile_path(profile_id, suffix):
+    return os.path.join(settings.PROFILING_DIR, profile_id + suffix)
+
+
+def delete_profile(profile_id):
+    for suffix in (META_SUFFIX, STATS_SUFFIX, STACKS_SUFFIX):
+        try:
+            os.remove(profile_path(profile_id, suffix))
+        except FileNotFoundError:
+            pass
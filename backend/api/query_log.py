@@ -0,0 +1,152 @@
+"""Журнал медленных запросов к базе.
+
+Запросы дольше SLOW_QUERY_THRESHOLD миллисекунд пишутся в лог
+foodgram.slow_queries строкой «slow_query {JSON}»: SQL, параметры,
+представление и действие, стек вызовов в коде проекта. На PostgreSQL к
+записи добавляется план EXPLAIN (FORMAT JSON); план запроса одного вида
+снимается не чаще раза в SLOW_QUERY_EXPLAIN_INTERVAL секунд на все
+процессы. Сводку по журналу строит команда slow_queries.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+
+from . import instrumentation
+
+logger = logging.getLogger('foodgram.slow_queries')
+
+LOG_PREFIX = 'slow_query '
+EXPLAIN_KEY = 'slow_queries:explain:{}'
+MAX_PARAMS_LENGTH = 1000
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+'), '(...), ...'),
+    (re.compile(r'\s+'), ' '),
+)
+
+_state = threading.local()
+
+
+def normalize(sql):
+    """Вид запроса: SQL без значений, длины списков IN и VALUES."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def statement_id(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _project_stack():
+    """Кадры стека из кода проекта, без библиотек и этого модуля."""
+    root = str(settings.BASE_DIR)
+    return [
+        f'{frame.filename[len(root) + 1:]}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(root)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+
+
+def _explain(connection, sql, params):
+    if (
+        connection.vendor != 'postgresql'
+        or not sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+    ):
+        return None
+    if not cache.add(
+        EXPLAIN_KEY.format(statement_id(sql)), 1,
+        settings.SLOW_QUERY_EXPLAIN_INTERVAL
+    ):
+        return None
+    try:
+        # Точка сохранения не даёт ошибке плана прервать транзакцию.
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+    except DatabaseError as error:
+        return {'error': str(error)}
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+class SlowQueryLogger:
+    """Обёртка выполнения запросов для connection.execute_wrappers."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'active', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            _state.active = True
+            try:
+                self.log(sql, params, many, duration)
+            except Exception:
+                # Сбой журнала не должен ломать сам запрос.
+                logger.exception('Не удалось записать медленный запрос')
+            finally:
+                _state.active = False
+        return result
+
+    def log(self, sql, params, many, duration):
+        request = instrumentation.current_request.get()
+        view, action = (
+            instrumentation.view_labels(request) if request is not None
+            else (None, None)
+        )
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(
+                timespec='seconds'
+            ),
+            'duration_ms': round(duration, 3),
+            'statement': statement_id(sql),
+            'sql': sql,
+            'params': repr(params)[:MAX_PARAMS_LENGTH],
+            'many': many,
+            'view': view,
+            'action': action,
+            'path': request.get_full_path() if request is not None else None,
+            'stack': _project_stack(),
+        }
+        if not many:
+            entry['explain'] = _explain(self.connection, sql, params)
+        instrumentation.increment('slow_queries', view=view, action=action)
+        logger.warning(
+            '%s%s', LOG_PREFIX,
+            json.dumps(entry, ensure_ascii=False, default=str)
+        )
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created: подключает журнал к соединению.
+
+    Список обёрток принадлежит объекту соединения Django и переживает
+    переподключения, поэтому обёртка добавляется один раз. Она ставится
+    в начало списка: соединение открывается при первом запросе, когда
+    временные обёртки (connection.execute_wrapper) уже могут быть
+    добавлены, а они снимаются с конца.
+    """
+    if not any(
+        isinstance(wrapper, SlowQueryLogger)
+        for wrapper in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.insert(0, SlowQueryLogger(connection))
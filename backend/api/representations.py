@@ -0,0 +1,132 @@
+"""Быстрое представление рецептов для чтения.
+
+Собирает тот же JSON, что и RecipeSerializer, из строк .values() и
+кортежей продуктов, минуя поля DRF. Порядок ключей и типы значений
+должны совпадать с сериализатором байт в байт: это проверяет команда
+compare_recipe_reads.
+"""
+from django.contrib.auth import get_user_model
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Follow
+from .serializers import RecipeSerializer, get_sparse_fields
+
+User = get_user_model()
+
+AUTHOR_FIELDS = (
+    'author__email', 'author__id', 'author__username',
+    'author__first_name', 'author__last_name', 'author__avatar',
+)
+COLUMNS = ('name', 'image', 'text', 'cooking_time')
+
+
+def _file_url(request, storage, name):
+    """URL файла так же, как его отдаёт ImageField в DRF."""
+    if not name:
+        return None
+    return request.build_absolute_uri(storage.url(name))
+
+
+class RecipeRepresentation:
+    """Поля ответа с учётом ?fields= и ?expand= запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.keys = list(
+            RecipeSerializer(context={'request': request}).fields
+        )
+        requested, expand = get_sparse_fields(request)
+        self.expanded = {
+            name for name in RecipeSerializer.collapsed_fields
+            if name in self.keys and (requested is None or name in expand)
+        }
+
+    def rows(self, queryset):
+        """Строки .values() только с нужными колонками."""
+        fields = ['id', 'author_id']
+        fields += [name for name in COLUMNS if name in self.keys]
+        if 'author' in self.expanded:
+            fields += AUTHOR_FIELDS
+        return queryset.values(*fields)
+
+    def represent(self, rows):
+        """Список словарей рецептов в формате RecipeSerializer.
+
+        Продукты и флаги текущего пользователя читаются одним запросом
+        каждый, независимо от числа рецептов.
+        """
+        rows = list(rows)
+        keys = self.keys
+        recipe_ids = [row['id'] for row in rows]
+        request = self.request
+        user = request.user
+        authenticated = bool(rows) and not user.is_anonymous
+
+        ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+        if 'ingredients' in self.expanded:
+            for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list(
+                'recipe_id', 'ingredient__id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            ):
+                ingredients[recipe_id].append({
+                    'id': ingredient[0],
+                    'name': ingredient[1],
+                    'measurement_unit': ingredient[2],
+                    'amount': ingredient[3],
+                })
+        elif 'ingredients' in keys:
+            for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'ingredient_id'):
+                ingredients[recipe_id].append(ingredient_id)
+
+        favorited = in_shopping_cart = subscribed = frozenset()
+        if authenticated and 'is_favorited' in keys:
+            favorited = set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        if authenticated and 'is_in_shopping_cart' in keys:
+            in_shopping_cart = set(ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        if authenticated and 'author' in self.expanded:
+            subscribed = set(Follow.objects.filter(
+                user=user,
+                author_id__in={row['author_id'] for row in rows}
+            ).values_list('author_id', flat=True))
+
+        image_storage = Recipe._meta.get_field('image').storage
+        avatar_storage = User._meta.get_field('avatar').storage
+
+        def author(row):
+            if 'author' not in self.expanded:
+                return row['author_id']
+            return {
+                'email': row['author__email'],
+                'id': row['author__id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'avatar': _file_url(
+                    request, avatar_storage, row['author__avatar']
+                ),
+                'is_subscribed': row['author_id'] in subscribed,
+            }
+
+        values = {
+            'id': lambda row: row['id'],
+            'author': author,
+            'ingredients': lambda row: ingredients[row['id']],
+            'is_favorited': lambda row: row['id'] in favorited,
+            'is_in_shopping_cart': lambda row: row['id'] in in_shopping_cart,
+            'name': lambda row: row['name'],
+            'image': lambda row: _file_url(
+                request, image_storage, row['image']
+            ),
+            'text': lambda row: row['text'],
+            'cooking_time': lambda row: row['cooking_time'],
+        }
+        getters = [(key, values[key]) for key in keys]
+        return [{key: get(row) for key, get in getters} for row in rows]
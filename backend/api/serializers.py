@@ -1,24 +1,107 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 
+from . import instrumentation
+from jobs.tasks import enqueue
 from recipes.models import (
     Ingredient,
     Recipe,
     RecipeIngredient
 )
+from recipes.coverage import recipe_changed
+from recipes.feed import fan_out
+from recipes.search import index_recipes
 from users.models import Follow
 
 User = get_user_model()
 
 
-class FoodgramUserSerializer(UserSerializer):
+class ImageUploadField(Base64ImageField):
+    """Base64ImageField, учитывающий размер загруженных картинок."""
+
+    def to_internal_value(self, data):
+        image = super().to_internal_value(data)
+        if image is not None:
+            instrumentation.observe(
+                'upload_bytes', image.size,
+                field=f'{self.parent.Meta.model._meta.model_name}.'
+                      f'{self.source}'
+            )
+        return image
+
+
+def _query_set(request, name):
+    return {
+        item.strip()
+        for value in request.query_params.getlist(name)
+        for item in value.split(',') if item.strip()
+    }
+
+
+def get_sparse_fields(request):
+    """Поля из ?fields= и ?expand= запроса.
+
+    Возвращает (поля, раскрываемые поля); поля равны None, если
+    параметр fields не передан и нужен полный ответ.
+    """
+    if request is None:
+        return None, set()
+    return _query_set(request, 'fields') or None, _query_set(request, 'expand')
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля из ?fields=.
+
+    Вложенные объекты из collapsed_fields при этом заменяются
+    идентификаторами, если их имени нет в ?expand=. Без ?fields=
+    ответ не меняется. Применяется только к сериализатору верхнего
+    уровня, вложенные сериализаторы отдают все поля.
+    """
+
+    collapsed_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+        requested, expand = get_sparse_fields(self.context.get('request'))
+        if requested is None:
+            return fields
+        errors = {}
+        unknown = requested - fields.keys()
+        if unknown:
+            errors['fields'] = (
+                f'Неизвестные поля: {", ".join(sorted(unknown))}'
+            )
+        unknown = expand - self.collapsed_fields.keys()
+        if unknown:
+            errors['expand'] = (
+                f'Нельзя раскрыть поля: {", ".join(sorted(unknown))}'
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
+        fields = {
+            name: field for name, field in fields.items() if name in requested
+        }
+        for name, collapsed_field in self.collapsed_fields.items():
+            if name in fields and name not in expand:
+                fields[name] = collapsed_field()
+        return fields
+
+
+class FoodgramUserSerializer(SparseFieldsMixin, UserSerializer):
     """Сериализатор для пользователя."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = ImageUploadField(required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -62,7 +145,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = FoodgramUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients',
@@ -81,6 +164,19 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
+    collapsed_fields = {
+        'author': partial(
+            serializers.PrimaryKeyRelatedField, read_only=True
+        ),
+        'ingredients': partial(
+            serializers.SlugRelatedField,
+            source='recipe_ingredients',
+            slug_field='ingredient_id',
+            many=True,
+            read_only=True
+        ),
+    }
+
     def get_is_favorited(self, recipe):
         user = self.context.get('request').user
         return (
@@ -111,7 +207,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         many=True,
         required=True
     )
-    image = Base64ImageField(required=True)
+    image = ImageUploadField(required=True)
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
@@ -190,6 +286,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         validated_data['author'] = self.context['request'].user
         recipe = super().create(validated_data)
         self._create_ingredients(recipe, ingredients)
+        enqueue(index_recipes, [recipe.id])
+        enqueue(fan_out, recipe.id)
+        transaction.on_commit(partial(recipe_changed, recipe.id))
         return recipe
 
     @transaction.atomic
@@ -197,7 +296,47 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         instance.recipe_ingredients.all().delete()
         ingredients = validated_data.pop('ingredients')
         self._create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        recipe = super().update(instance, validated_data)
+        enqueue(index_recipes, [recipe.id])
+        transaction.on_commit(partial(recipe_changed, recipe.id))
+        return recipe
+
+
+class IngredientCoverageSerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся продуктам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+    exclude = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        default=list,
+        max_length=100
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для массовых операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
+class RecipeFlagsQuerySerializer(RecipeIdsSerializer):
+    """Рецепты, для которых запрашиваются пользовательские флаги."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=300
+    )
 
 
 class UserWithRecipesSerializer(FoodgramUserSerializer):
@@ -214,12 +353,21 @@ class UserWithRecipesSerializer(FoodgramUserSerializer):
         )
         read_only_fields = fields
 
+    collapsed_fields = {
+        'recipes': partial(
+            serializers.SerializerMethodField, method_name='get_recipe_ids'
+        ),
+    }
+
+    def _recipes(self, user):
+        return user.recipes.all()[:int(
+            self.context.get('request').GET.get('recipes_limit', 10**10))]
+
+    def get_recipe_ids(self, user):
+        return [recipe.id for recipe in self._recipes(user).only('id')]
+
     def get_recipes(self, user):
-        return RecipeShortSerializer(
-            user.recipes.all()[:int(
-                self.context.get('request').GET.get('recipes_limit', 10**10))],
-            many=True
-        ).data
+        return RecipeShortSerializer(self._recipes(user), many=True).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
@@ -0,0 +1,126 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import instrumentation
+
+
+@lru_cache(maxsize=None)
+def _redis_client():
+    """Клиент Redis кэша по умолчанию или None для других бэкендов."""
+    if not isinstance(caches[DEFAULT_CACHE_ALIAS], RedisCache):
+        return None
+    # Библиотеку уже требует RedisCache; импорт при первом запросе не
+    # замедляет запуск процессов с другим кэшем.
+    import redis
+
+    location = settings.CACHES[DEFAULT_CACHE_ALIAS]['LOCATION']
+    if not isinstance(location, str):
+        location = location[0]
+    # Запись RedisCache ведёт на первый сервер списка.
+    return redis.Redis.from_url(re.split('[;,]', location)[0])
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов скользящим окном.
+
+    Счётчики текущего и предыдущего окна хранятся в кэше; число
+    запросов за последние duration секунд оценивается как счётчик
+    текущего окна плюс доля предыдущего, ещё попадающая в интервал.
+    С Redis проверка — одна транзакция MULTI/EXEC за один обмен с
+    сервером: INCR и EXPIRE счётчика текущего окна и GET предыдущего.
+    Она одинаково работает в нескольких процессах gunicorn. С другими
+    бэкендами кэша остаются incr (с add на первом запросе окна) и
+    отдельное чтение. Предыдущее окно уже закрыто и только читается.
+    Отклонённые запросы тоже учитываются, поэтому клиент, продолжающий
+    слать запросы, остаётся заблокированным.
+
+    Область действия берётся из throttle_scope представления или из
+    throttle_scopes — словаря «действие → область» для ViewSet.
+    Действия без области не ограничиваются.
+    """
+
+    cache = default_cache
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # Область становится известна только в allow_request.
+        pass
+
+    def get_scope(self, view):
+        scopes = getattr(view, 'throttle_scopes', None)
+        if scopes is not None:
+            return scopes.get(getattr(view, 'action', None))
+        return getattr(view, 'throttle_scope', None)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user{request.user.pk}'
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def _incr(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout=2 * self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def _counters(self, key, window):
+        """Счётчик текущего окна после инкремента и счётчик предыдущего."""
+        current, previous = f'{key}:{window}', f'{key}:{window - 1}'
+        client = _redis_client() if self.cache is default_cache else None
+        if client is None:
+            return self._incr(current), self.cache.get(previous, 0)
+        current = self.cache.make_and_validate_key(current)
+        pipeline = client.pipeline()
+        pipeline.incr(current)
+        pipeline.expire(current, 2 * self.duration)
+        pipeline.get(self.cache.make_and_validate_key(previous))
+        count, _, previous_count = pipeline.execute()
+        return count, int(previous_count or 0)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(view)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        key = self.get_cache_key(request, view)
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        window = int(window)
+        self.offset = offset
+        self.current, self.previous = self._counters(key, window)
+        self.previous_weight = 1 - offset / self.duration
+        estimate = self.previous * self.previous_weight + self.current
+        if estimate <= self.num_requests:
+            return True
+        instrumentation.increment('throttle_rejections', scope=self.scope)
+        return False
+
+    def wait(self):
+        """Секунды до момента, когда оценка опустится ниже лимита."""
+        excess = self.current - self.num_requests
+        remaining = self.duration - self.offset
+        if excess > 0:
+            # Текущее окно само исчерпало лимит: ждать его конца и
+            # ухода его доли из следующего окна.
+            return remaining + self.duration * excess / self.current
+        if not self.previous:
+            return remaining
+        # Доля предыдущего окна убывает на previous / duration в секунду.
+        allowed = self.num_requests - self.current
+        return max(
+            (self.previous * self.previous_weight - allowed)
+            * self.duration / self.previous,
+            0
+        )
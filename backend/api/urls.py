@@ -1,9 +1,11 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
+    FoodgramTokenCreateView,
     FoodgramUserViewSet,
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
 )
 
@@ -16,5 +18,11 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
+    re_path(
+        r'^auth/token/login/?$',
+        FoodgramTokenCreateView.as_view(),
+        name='login'
+    ),
     path('auth/', include('djoser.urls.authtoken')),
+    re_path(r'^metrics/?$', MetricsView.as_view(), name='metrics'),
 ]
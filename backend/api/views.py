@@ -1,48 +1,89 @@
 from datetime import datetime
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse, Http404
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
 from rest_framework.response import Response
-from djoser.views import UserViewSet
+from rest_framework.views import APIView
+from djoser.views import TokenCreateView, UserViewSet
 
+from . import catalogue, instrumentation, metrics
 from .permissions import IsAuthorOrReadOnly
 from .filters import RecipeFilter
-from .pagination import FoodgramPageNumberPagination
+from .pagination import FoodgramPageNumberPagination, KeysetPagination
+from .renderers import PrometheusRenderer
+from .representations import RecipeRepresentation
 from .serializers import (
     FoodgramUserSerializer,
+    IngredientCoverageSerializer,
     UserWithRecipesSerializer,
     IngredientSerializer,
+    RecipeFlagsQuerySerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     RecipeWriteSerializer,
-    RecipeShortSerializer
+    RecipeShortSerializer,
+    get_sparse_fields
 )
 from recipes.models import (
     Favorite,
     Ingredient,
+    PopularRecipe,
     Recipe,
     RecipeIngredient,
-    ShoppingCart
+    ShoppingCart,
+    SimilarRecipe
 )
+from recipes import detail_cache, feed as subscription_feed
+from recipes.coverage import get_coverage_index
+from recipes.relations import add_follow, add_recipe, remove
+from users.export import export_archive
 from users.models import Follow
 
 User = get_user_model()
 
 
+def _object_id(pk):
+    """id объекта из URL; нечисловое значение означает 404."""
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def _is_idempotent(request):
+    """С заголовком Idempotency-Key повтор добавления или удаления
+    считается успехом, а не ошибкой."""
+    return 'HTTP_IDEMPOTENCY_KEY' in request.META
+
+
 class FoodgramUserViewSet(UserViewSet):
     """ViewSet для работы с пользователями."""
     serializer_class = FoodgramUserSerializer
     queryset = User.objects.all()
     pagination_class = FoodgramPageNumberPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
+    throttle_scopes = {'subscribe': 'subscribe', 'export': 'data_export'}
+
+    def get_queryset(self):
+        users = super().get_queryset()
+        requested, _ = get_sparse_fields(self.request)
+        if self.action in ('list', 'retrieve') and requested is not None:
+            users = users.only('id', *requested & {
+                'email', 'username', 'first_name', 'last_name', 'avatar'
+            })
+        return users
 
     @action(
         detail=False,
@@ -56,6 +97,25 @@ class FoodgramUserViewSet(UserViewSet):
         )
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        url_path='me/export',
+        permission_classes=[IsAuthenticated]
+    )
+    def export(self, request):
+        """ZIP-архив с данными пользователя, передаётся по мере сборки."""
+        user = request.user
+        response = StreamingHttpResponse(
+            export_archive(user), content_type='application/zip'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="foodgram-{user.pk}-'
+            f'{datetime.now():%Y%m%d}.zip"'
+        )
+        # nginx не должен копить ответ целиком перед отправкой.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
     @action(
         detail=False,
         methods=['put', 'delete'],
@@ -86,8 +146,8 @@ class FoodgramUserViewSet(UserViewSet):
 
         if request.method == 'DELETE':
             if user.avatar:
-                user.avatar.delete()
-                user.save()
+                user.avatar = None
+                user.save(update_fields=['avatar'])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -96,38 +156,43 @@ class FoodgramUserViewSet(UserViewSet):
         permission_classes=[IsAuthenticated]
     )
     def subscribe(self, request, **kwargs):
-        author_id = kwargs.get('id')
+        author_id = _object_id(kwargs.get('id'))
 
         if request.method == 'DELETE':
-            follow = get_object_or_404(
-                Follow, user=request.user, author_id=author_id
-            )
-            follow.delete()
+            deleted = remove(Follow.objects.filter(
+                user=request.user, author_id=author_id
+            ))
+            if not deleted and not _is_idempotent(request):
+                raise Http404
+            if deleted:
+                subscription_feed.unsubscribe(request.user.id, author_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        author = get_object_or_404(User, id=author_id)
-        if request.user == author:
+        if request.user.id == author_id:
             return Response(
                 {'errors': 'Нельзя подписаться на самого себя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        follow, created = Follow.objects.get_or_create(
-            user=request.user, author=author
-        )
-        if not created:
+        exists, created = add_follow(request.user.id, author_id)
+        if not exists:
+            raise Http404
+        if not created and not _is_idempotent(request):
             return Response(
-                {'errors': f'Вы уже подписаны на пользователя'
-                 f'{author.username}'},
+                {'errors': 'Вы уже подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if created:
+            subscription_feed.backfill(request.user.id, author_id)
 
         serializer = UserWithRecipesSerializer(
-            author,
+            User.objects.get(pk=author_id),
             context={'request': request}
         )
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED)
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
     @action(
         detail=False,
@@ -145,11 +210,38 @@ class FoodgramUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
+class FoodgramTokenCreateView(TokenCreateView):
+    """Получение токена с ограничением числа попыток."""
+    throttle_scope = 'auth_token'
+
+
+class MetricsView(APIView):
+    """Метрики приложения для Prometheus; доступны только сотрудникам."""
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PrometheusRenderer,)
+
+    def get(self, request):
+        return Response(
+            metrics.render(), content_type=metrics.CONTENT_TYPE
+        )
+
+
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Полный справочник отдаётся из снимка (api/catalogue.py)."""
+        if (
+            not request.query_params.get('name')
+            and request.accepted_renderer.format == 'json'
+        ):
+            snapshot = catalogue.load()
+            if snapshot is not None:
+                return catalogue.response(request, snapshot)
+        return super().list(request, *args, **kwargs)
+
     def get_queryset(self):
         queryset = Ingredient.objects.all()
         name = self.request.query_params.get('name')
@@ -163,12 +255,113 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'favorite': 'favorite',
+        'favorite_bulk': 'favorite',
+        'shopping_cart': 'shopping_cart',
+        'shopping_cart_bulk': 'shopping_cart',
+        'clear_shopping_cart': 'shopping_cart',
+    }
 
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
             return RecipeWriteSerializer
         return RecipeSerializer
 
+    def get_queryset(self):
+        """Для чтения загружает только то, что попадёт в ответ."""
+        recipes = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return recipes
+        requested, expand = get_sparse_fields(self.request)
+        fields = requested or set(RecipeSerializer.Meta.fields)
+        recipes = recipes.defer(*(
+            name for name in ('name', 'image', 'text', 'cooking_time')
+            if name not in fields
+        ))
+        expanded = expand if requested else fields
+        if 'author' in fields and 'author' in expanded:
+            recipes = recipes.select_related('author')
+        if 'ingredients' in fields:
+            ingredients = RecipeIngredient.objects.all()
+            if 'ingredients' in expanded:
+                ingredients = ingredients.select_related('ingredient')
+            recipes = recipes.prefetch_related(
+                Prefetch('recipe_ingredients', queryset=ingredients)
+            )
+        return recipes
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_RECIPE_READS:
+            return super().list(request, *args, **kwargs)
+        representation = RecipeRepresentation(request)
+        rows = representation.rows(
+            self.filter_queryset(self.get_queryset())
+        )
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(representation.represent(rows))
+        return self.get_paginated_response(representation.represent(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Страница рецепта из кэша с флагами текущего пользователя.
+
+        Запросы с параметрами (fields, фильтры) идут мимо кэша.
+        """
+        if request.query_params or not settings.RECIPE_DETAIL_CACHE_TIMEOUT:
+            return self._retrieve(request, *args, **kwargs)
+        try:
+            recipe_id = int(kwargs['pk'])
+        except ValueError:
+            raise Http404
+        key = detail_cache.document_key(
+            recipe_id, request.build_absolute_uri('/')
+        )
+        document = cache.get(key)
+        instrumentation.increment(
+            'cache_requests', cache='recipe_detail',
+            result='miss' if document is None else 'hit'
+        )
+        if document is None:
+            response = self._retrieve(request, *args, **kwargs)
+            detail_cache.set_document(key, response.data)
+            return response
+        if request.user.is_anonymous:
+            return Response(document)
+        user = request.user
+        flags = Recipe.objects.filter(pk=recipe_id).values_list(
+            Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        ).first()
+        if flags is None:
+            raise Http404
+        return Response(detail_cache.apply_user_flags(document, *flags))
+
+    def _retrieve(self, request, *args, **kwargs):
+        if not settings.FAST_RECIPE_READS:
+            return super().retrieve(request, *args, **kwargs)
+        representation = RecipeRepresentation(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            recipes = representation.represent(
+                representation.rows(queryset.filter(pk=kwargs['pk']))
+            )
+        except (TypeError, ValueError):
+            raise Http404
+        if not recipes:
+            raise Http404
+        return Response(recipes[0])
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -190,9 +383,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._remove_from(ShoppingCart, request.user, pk)
 
     def _add_to(self, model, user, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        obj, created = model.objects.get_or_create(user=user, recipe=recipe)
-        if not created:
+        recipe, created = add_recipe(model, user.id, _object_id(pk))
+        if recipe is None:
+            raise Http404
+        if not created and not _is_idempotent(self.request):
             return Response(
                 {'error': f'Рецепт "{recipe.name}" '
                  f'уже добавлен в {model._meta.verbose_name}'},
@@ -200,13 +394,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         serializer = RecipeShortSerializer(
             recipe, context={'request': self.request})
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
     def _remove_from(self, model, user, pk):
-        obj = get_object_or_404(model, user=user, recipe_id=pk)
-        obj.delete()
+        deleted = remove(model.objects.filter(
+            user=user, recipe_id=_object_id(pk)
+        ))
+        if not deleted and not _is_idempotent(self.request):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self._bulk_update(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self._bulk_update(ShoppingCart, request)
+
+    @action(
+        detail=False,
+        methods=['delete'],
+        url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def clear_shopping_cart(self, request):
+        ShoppingCart.objects.filter(user=request.user).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _bulk_update(self, model, request):
+        """Добавляет или удаляет несколько рецептов за постоянное число
+        запросов и возвращает результат для каждого id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        user = request.user
+
+        if request.method == 'DELETE':
+            removed = set(model.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            model.objects.filter(user=user, recipe_id__in=removed).delete()
+            statuses = {recipe_id: 'removed' for recipe_id in removed}
+            default_status = 'absent'
+        else:
+            recipes = dict(Recipe.objects.filter(
+                id__in=recipe_ids
+            ).annotate(
+                is_added=Exists(model.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                ))
+            ).values_list('id', 'is_added'))
+            model.objects.bulk_create(
+                [
+                    model(user=user, recipe_id=recipe_id)
+                    for recipe_id, is_added in recipes.items()
+                    if not is_added
+                ],
+                ignore_conflicts=True
+            )
+            statuses = {
+                recipe_id: 'exists' if is_added else 'added'
+                for recipe_id, is_added in recipes.items()
+            }
+            default_status = 'not_found'
+
+        return Response({
+            'results': [
+                {
+                    'id': recipe_id,
+                    'status': statuses.get(recipe_id, default_status),
+                }
+                for recipe_id in recipe_ids
+            ]
+        })
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated]
@@ -214,12 +489,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         user = request.user
 
-        ingredients = RecipeIngredient.objects.filter(
+        ingredients = list(RecipeIngredient.objects.filter(
             recipe__shoppingcart__user=user
         ).values(
             'ingredient__name',
             'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount')).order_by('ingredient__name')
+        ).annotate(amount=Sum('amount')).order_by('ingredient__name'))
+        instrumentation.observe('shopping_list_rows', len(ingredients))
 
         shopping_cart_recipes = Recipe.objects.filter(
             shoppingcart__user=user
@@ -250,6 +526,155 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return response
 
+    @action(
+        detail=False,
+        url_path='cook-with',
+        url_name='cook-with',
+    )
+    def cook_with(self, request):
+        """Рецепты, которые можно приготовить из имеющихся продуктов."""
+        data = {
+            name: self._query_list(name) for name in ('ingredients', 'exclude')
+        }
+        if 'max_missing' in request.query_params:
+            data['max_missing'] = request.query_params['max_missing']
+        query = IngredientCoverageSerializer(data=data)
+        query.is_valid(raise_exception=True)
+
+        matches = get_coverage_index().query(
+            query.validated_data['ingredients'],
+            max_missing=query.validated_data.get('max_missing'),
+            exclude=query.validated_data['exclude'],
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self._represent([recipe_id for recipe_id, _, _ in page])
+        results = []
+        for recipe_id, covered, missing in page:
+            if recipe_id not in recipes:
+                continue
+            results.append({
+                **recipes[recipe_id],
+                'covered_ingredients': covered,
+                'missing_ingredients': missing,
+            })
+        return self.get_paginated_response(results)
+
+    def _represent(self, recipe_ids):
+        """Рецепты по id в формате RecipeSerializer.
+
+        Продукты и флаги пользователя читаются одним запросом каждый,
+        а не на каждый рецепт.
+        """
+        representation = RecipeRepresentation(self.request)
+        rows = list(representation.rows(
+            self.get_queryset().filter(id__in=recipe_ids)
+        ))
+        return dict(zip(
+            (row['id'] for row in rows), representation.represent(rows)
+        ))
+
+    def _query_list(self, name):
+        """Список из параметра вида ?name=1,2&name=3."""
+        return [
+            item
+            for value in self.request.query_params.getlist(name)
+            for item in value.split(',') if item
+        ]
+
+    @action(detail=False)
+    def flags(self, request):
+        """Пользовательские флаги для списка рецептов.
+
+        Нужен для карточек, отрисованных из кэша: отвечает не более чем
+        тремя запросами к избранному, спискам покупок и подпискам.
+        """
+        query = RecipeFlagsQuerySerializer(
+            data={'ids': self._query_list('ids')}
+        )
+        query.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(query.validated_data['ids']))
+        user = request.user
+        favorited = in_shopping_cart = subscribed = set()
+        if not user.is_anonymous:
+            favorited = set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            in_shopping_cart = set(ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            subscribed = set(Follow.objects.filter(
+                user=user, author__recipes__id__in=recipe_ids
+            ).values_list('author__recipes__id', flat=True))
+        return Response([
+            {
+                'id': recipe_id,
+                'is_favorited': recipe_id in favorited,
+                'is_in_shopping_cart': recipe_id in in_shopping_cart,
+                'is_subscribed': recipe_id in subscribed,
+            }
+            for recipe_id in recipe_ids
+        ])
+
+    @action(detail=False)
+    def popular(self, request):
+        """Популярные рецепты за день, неделю или всё время."""
+        window = request.query_params.get('window', PopularRecipe.Window.WEEK)
+        if window not in PopularRecipe.Window.values:
+            return Response(
+                {'window': f'Допустимые значения: '
+                 f'{", ".join(PopularRecipe.Window.values)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        representation = RecipeRepresentation(request)
+        rows = representation.rows(
+            Recipe.objects.filter(popularity__window=window).order_by(
+                '-popularity__score', '-id'
+            )
+        )
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(representation.represent(page))
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        """Рецепты, которые часто сохраняют вместе с данным."""
+        similar = SimilarRecipe.objects.filter(
+            recipe_id=pk
+        ).select_related('similar').order_by('-score')
+        recipes = [item.similar for item in similar]
+        if not recipes and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = RecipeShortSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        paginator = KeysetPagination()
+        limit = paginator.get_page_size(request)
+        positions = subscription_feed.get_feed(
+            request.user.id, paginator.decode_cursor(request), limit
+        )
+        next_position = None
+        if len(positions) > limit:
+            next_position = positions[limit - 1]
+        recipes = self._represent(
+            [recipe_id for _, recipe_id in positions[:limit]]
+        )
+        return paginator.get_keyset_response(
+            request,
+            [
+                recipes[recipe_id]
+                for _, recipe_id in positions[:limit]
+                if recipe_id in recipes
+            ],
+            next_position
+        )
+
     @action(
         detail=True,
         methods=("get",),
@@ -16,16 +16,19 @@ from pathlib import Path
 from django.core.management.utils import get_random_secret_key
 from dotenv import load_dotenv
 
-load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Явный путь: без него load_dotenv ищет .env обходом каталогов вверх
+# при каждом запуске процесса.
+load_dotenv(BASE_DIR.parent / '.env')
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.getenv('SECRET_KEY', get_random_secret_key())
+SECRET_KEY = os.getenv('SECRET_KEY') or get_random_secret_key()
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
@@ -49,10 +52,15 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -97,6 +105,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# Счётчикам ограничения частоты запросов нужен общий для всех процессов
+# gunicorn кэш: CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -155,9 +178,26 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.FoodgramPageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.SlidingWindowRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'favorite': os.getenv('THROTTLE_FAVORITE', '60/min'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '60/min'),
+        'subscribe': os.getenv('THROTTLE_SUBSCRIBE', '30/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '60/min'),
+        'auth_token': os.getenv('THROTTLE_AUTH_TOKEN', '10/min'),
+        'data_export': os.getenv('THROTTLE_DATA_EXPORT', '5/hour'),
+    },
+    # Запросы приходят через nginx, адрес клиента — в X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
 DJOSER = {
@@ -173,3 +213,97 @@ DJOSER = {
         'user_list': ['rest_framework.permissions.AllowAny'],
     },
 }
+
+# Recipes
+# Время жизни индекса продуктов в памяти процесса, секунды
+COVERAGE_INDEX_TTL = int(os.getenv('COVERAGE_INDEX_TTL', 60 * 60))
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 50))
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', 1000))
+
+# Сколько рецептов хранится в рейтинге популярных для каждого окна
+POPULAR_RECIPES_LIMIT = int(os.getenv('POPULAR_RECIPES_LIMIT', 100))
+
+# Чтение рецептов в обход сериализаторов DRF (api/representations.py)
+FAST_RECIPE_READS = os.getenv('FAST_RECIPE_READS', 'False') == 'True'
+
+# Сжатие ответов (api/middleware.py): ответы меньше порога не сжимаются
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CACHE_TIMEOUT = int(os.getenv('COMPRESSION_CACHE_TIMEOUT', 10 * 60))
+
+# Кэш страницы рецепта (recipes/detail_cache.py), секунды; 0 отключает.
+# Несколько процессов gunicorn должны использовать общий кэш.
+RECIPE_DETAIL_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_DETAIL_CACHE_TIMEOUT', 60 * 60)
+)
+
+# Профилирование запросов по требованию (api/profiling.py); пустой
+# PROFILING_DIR отключает его
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 50))
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 60 * 60))
+# Интервал сэмплирования стека, миллисекунды
+PROFILING_SAMPLE_INTERVAL = int(os.getenv('PROFILING_SAMPLE_INTERVAL', 1))
+
+# Журнал медленных запросов к базе (api/query_log.py): порог в
+# миллисекундах, 0 отключает; пустой SLOW_QUERY_LOG — вывод в stderr
+SLOW_QUERY_THRESHOLD = int(os.getenv('SLOW_QUERY_THRESHOLD', 200))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '')
+SLOW_QUERY_EXPLAIN_INTERVAL = int(
+    os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 60 * 60)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'message',
+        } if SLOW_QUERY_LOG else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'foodgram.jobs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Бюджет времени импорта при запуске процесса gunicorn, миллисекунды
+# (команда check_import_time)
+IMPORT_TIME_BUDGET = int(os.getenv('IMPORT_TIME_BUDGET', 1500))
+
+# Фоновые задачи (jobs): число попыток, первая задержка повтора и
+# интервал опроса очереди, секунды; задача, взятая в работу дольше
+# JOBS_LOCK_TIMEOUT секунд назад, забирается другим обработчиком.
+# JOBS_EAGER выполняет задачи сразу, без run_worker
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_POLL_INTERVAL = int(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 10 * 60))
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+
+# Снимок справочника ингредиентов (api/catalogue.py). С
+# INGREDIENT_SNAPSHOT_ACCEL, адресом внутренней location nginx, снимок
+# отдаёт nginx; пустое значение — Django
+INGREDIENT_SNAPSHOT_DIR = os.path.join(MEDIA_ROOT, 'catalogue')
+INGREDIENT_SNAPSHOT_ACCEL = os.getenv('INGREDIENT_SNAPSHOT_ACCEL', '')
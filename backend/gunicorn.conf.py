@@ -0,0 +1,42 @@
+"""Настройки gunicorn; файл читается автоматически из рабочего каталога."""
+import gc
+import os
+
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# Перезапуск процесса после max_requests запросов; разброс не даёт всем
+# процессам перезапуститься одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+# Синхронный процесс, дольше timeout секунд занятый одним запросом,
+# перезапускается; выгрузка данных (users/export.py) передаётся всё это
+# время
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+
+def when_ready(server):
+    # С --preload приложение уже загружено в главном процессе; там же
+    # загружаются URLconf со всеми представлениями и сериализаторами,
+    # и новые процессы, в том числе после max_requests, получают всё это
+    # при fork готовым.
+    if not server.cfg.preload_app:
+        return
+    from django.core.cache import caches
+    from django.db import connections
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    # Соединения главного процесса нельзя делить с дочерними.
+    connections.close_all()
+    caches.close_all()
+    # Объекты главного процесса не попадают в сборку мусора процессов:
+    # иначе сборщик трогает их страницы и копирование при записи
+    # теряет смысл.
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    # Значения завершившегося процесса остаются в файлах метрик
+    # (api/metrics.py), но их больше не нужно обновлять.
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
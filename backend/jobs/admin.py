@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Административное представление фоновых задач."""
+
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'max_attempts', 'run_at',
+        'locked_by', 'created_at'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('locked_at', 'locked_by', 'last_error', 'created_at')
+    actions = ('retry',)
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        """Возвращает задачи в очередь с новым запасом попыток."""
+        updated = queryset.exclude(status=Job.Status.RUNNING).update(
+            status=Job.Status.QUEUED, attempts=0, run_at=timezone.now()
+        )
+        self.message_user(request, f'Задач в очереди: {updated}')
@@ -0,0 +1,70 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from jobs.process import work_in_process
+from jobs.worker import work, worker_id
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди пулом потоков или процессов; '
+        'SIGTERM и Ctrl+C завершают работу после текущих задач'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=2,
+            help='число одновременно выполняемых задач'
+        )
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='потоки подходят для задач, ждущих базу и диск; процессы '
+                 '— для нагружающих процессор'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='выйти, когда в очереди не останется готовых задач'
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        concurrency = max(options['concurrency'], 1)
+        burst = options['burst']
+        if options['pool'] == 'process':
+            context = multiprocessing.get_context('spawn')
+            workers = [
+                context.Process(
+                    target=work_in_process, args=(number, burst)
+                )
+                for number in range(concurrency)
+            ]
+        else:
+            workers = [
+                threading.Thread(
+                    target=work, args=(worker_id(number), stop, burst)
+                )
+                for number in range(concurrency)
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write('Завершение после текущих задач...')
+            stop.set()
+            for worker in workers:
+                if isinstance(worker, multiprocessing.process.BaseProcess):
+                    worker.terminate()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        self.stdout.write(
+            f'Обработчиков: {concurrency} ({options["pool"]}).'
+        )
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            # join с таймаутом оставляет главный поток отзывчивым к
+            # сигналам.
+            while worker.is_alive():
+                worker.join(1)
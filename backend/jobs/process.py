@@ -0,0 +1,20 @@
+"""Точка входа процесса пула run_worker --pool process.
+
+Процесс запускается заново (spawn), а не копией родителя: так он не
+наследует соединения с базой. Модели импортируются только после
+django.setup().
+"""
+import signal
+import threading
+
+import django
+
+
+def work_in_process(number, burst):
+    django.setup()
+    from .worker import work, worker_id
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+    work(worker_id(number), stop, burst)
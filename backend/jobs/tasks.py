@@ -0,0 +1,50 @@
+"""Фоновые задачи.
+
+Функция становится задачей декоратором task; enqueue ставит её в очередь
+после фиксации текущей транзакции, а выполняет её команда run_worker.
+Аргументы хранятся в JSON, поэтому передаются id, а не объекты моделей.
+Задача может выполниться повторно (после сбоя обработчика или ошибки),
+поэтому должна быть идемпотентной.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+def task(function=None, *, max_attempts=None):
+    """Помечает функцию как задачу, которую можно поставить в очередь."""
+    if function is None:
+        return partial(task, max_attempts=max_attempts)
+    function.job_name = f'{function.__module__}.{function.__qualname__}'
+    function.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+    return function
+
+
+def get_task(name):
+    """Задача по имени из записи очереди."""
+    function = import_string(name)
+    if getattr(function, 'job_name', None) != name:
+        raise ImportError(f'{name} не помечена декоратором task.')
+    return function
+
+
+def enqueue(function, *args, **kwargs):
+    """Ставит задачу в очередь после фиксации транзакции.
+
+    При откате транзакции задача не ставится. С JOBS_EAGER задача
+    выполняется сразу в текущем процессе — для разработки без run_worker.
+    """
+    if settings.JOBS_EAGER:
+        transaction.on_commit(partial(function, *args, **kwargs))
+        return
+    transaction.on_commit(partial(
+        Job.objects.create,
+        name=function.job_name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=function.max_attempts,
+    ))
@@ -0,0 +1,153 @@
+"""Выполнение задач из очереди.
+
+Обработчик забирает задачу запросом SELECT ... FOR UPDATE SKIP LOCKED:
+строки, захваченные другими обработчиками, пропускаются без ожидания.
+На SQLite блокировок строк нет, и выбор с захватом — один UPDATE с
+подзапросом: он выполняется под блокировкой записи всей базы, поэтому
+задачу получает только один обработчик. Задача, взятая
+в работу больше JOBS_LOCK_TIMEOUT секунд назад, считается брошенной
+упавшим обработчиком и забирается снова.
+
+Задача с ошибкой возвращается в очередь с экспоненциально растущей
+задержкой; после max_attempts попыток она остаётся в состоянии failed
+и видна в админке. Выполненные задачи удаляются.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .models import Job
+from .tasks import get_task
+
+logger = logging.getLogger('foodgram.jobs')
+
+MAX_RETRY_DELAY = 60 * 60
+
+
+def worker_id(number):
+    return f'{socket.gethostname()}:{os.getpid()}:{number}'
+
+
+def _claimable(now):
+    return Q(status=Job.Status.QUEUED, run_at__lte=now) | Q(
+        status=Job.Status.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    )
+
+
+def claim(worker):
+    """Забирает первую готовую к запуску задачу или возвращает None."""
+    now = timezone.now()
+    with transaction.atomic():
+        ready = Job.objects.filter(_claimable(now)).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Строка заблокирована до конца транзакции, другие
+            # обработчики её пропускают.
+            job_id = ready.select_for_update(skip_locked=True).values_list(
+                'id', flat=True
+            ).first()
+            if job_id is None:
+                return None
+            job = Job.objects.filter(pk=job_id)
+        else:
+            job = Job.objects.filter(
+                pk__in=Subquery(ready.values('pk')[:1])
+            )
+        if not job.update(
+            status=Job.Status.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F('attempts') + 1,
+        ):
+            return None
+    return Job.objects.get(locked_by=worker, locked_at=now)
+
+
+def retry_delay(attempts):
+    """Задержка перед попыткой attempts + 1: растёт вдвое, со случайным
+    разбросом, чтобы повторы упавших вместе задач не шли одновременно."""
+    delay = min(
+        settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def execute(job):
+    """Выполняет захваченную задачу и записывает результат."""
+    # Строка задачи остаётся за обработчиком, пока её не перехватили
+    # после JOBS_LOCK_TIMEOUT.
+    own = Job.objects.filter(
+        pk=job.pk, locked_by=job.locked_by, locked_at=job.locked_at
+    )
+    started = time.perf_counter()
+    try:
+        function = get_task(job.name)
+    except ImportError:
+        own.update(status=Job.Status.FAILED, last_error=traceback.format_exc())
+        logger.error('Неизвестная задача %s #%s', job.name, job.pk)
+        return
+    try:
+        function(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            own.update(status=Job.Status.FAILED, last_error=error)
+            logger.error(
+                'Задача %s #%s не выполнена за %s попыток:\n%s',
+                job.name, job.pk, job.attempts, error
+            )
+        else:
+            delay = retry_delay(job.attempts)
+            own.update(
+                status=Job.Status.QUEUED,
+                run_at=timezone.now() + timedelta(seconds=delay),
+                last_error=error,
+            )
+            logger.warning(
+                'Задача %s #%s, попытка %s: ошибка, повтор через %.0f с:\n%s',
+                job.name, job.pk, job.attempts, delay, error
+            )
+        return
+    own.delete()
+    logger.info(
+        'Задача %s #%s выполнена за %.3f с',
+        job.name, job.pk, time.perf_counter() - started
+    )
+
+
+def work(worker, stop, burst=False):
+    """Цикл обработчика: до stop или, с burst, до опустения очереди."""
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                job = claim(worker)
+                if job is None:
+                    if burst:
+                        return
+                    stop.wait(settings.JOBS_POLL_INTERVAL)
+                    continue
+                execute(job)
+            except DatabaseError:
+                # База недоступна или ещё не мигрирована: обработчик
+                # ждёт её, а не завершается. Задача, взятая до ошибки,
+                # будет забрана снова после JOBS_LOCK_TIMEOUT.
+                logger.exception('Ошибка базы данных в обработчике %s', worker)
+                close_old_connections()
+                stop.wait(settings.JOBS_POLL_INTERVAL)
+    finally:
+        connection.close()
@@ -1,9 +1,14 @@
+from functools import partial
+
 from django.contrib import admin
 from django.contrib.admin import display
 from django.utils.safestring import mark_safe
+from django.db import transaction
 from django.db.models import Count
 from django.db.models import Min, Max
 
+from api.catalogue import build_snapshot
+from jobs.tasks import enqueue
 from users.admin import BaseListFilter
 from .models import (
     Favorite,
@@ -12,6 +17,8 @@ from .models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from .coverage import recipe_changed
+from .search import index_recipes
 
 
 class OptimizedQuerysetMixin:
@@ -143,6 +150,14 @@ class RecipeAdmin(admin.ModelAdmin):
             'style="border-radius: 8px; object-fit: cover;" />'
         return '<span style="color: #999;">Нет изображения</span>'
 
+    def save_model(self, request, recipe, form, change):
+        super().save_model(request, recipe, form, change)
+        enqueue(index_recipes, [recipe.id])
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        transaction.on_commit(partial(recipe_changed, form.instance.id))
+
     def get_queryset(self, request):
         """Возвращает оптимизированный queryset для списка рецептов."""
         queryset = super().get_queryset(request)
@@ -177,12 +192,24 @@ class IngredientAdmin(admin.ModelAdmin):
             recipes_count=Count('recipe_ingredients', distinct=True)
         )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        enqueue(build_snapshot)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        enqueue(build_snapshot)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        enqueue(build_snapshot)
+
 
 @admin.register(Favorite, ShoppingCart)
 class FavoriteShoppingCartAdmin(admin.ModelAdmin, OptimizedQuerysetMixin):
     """Административное представление избранного и списка покупок."""
 
-    list_display = ('user', 'recipe')
+    list_display = ('user', 'recipe', 'created_at')
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('user__is_active', 'recipe__author')
 
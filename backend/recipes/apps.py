@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+
+        from .models import Recipe
+        from .search import recipe_deleted
+        post_delete.connect(recipe_deleted, sender=Recipe)
@@ -0,0 +1,204 @@
+"""Поиск рецептов по имеющимся продуктам.
+
+Индекс «продукт → рецепты» хранится в памяти процесса в виде
+отсортированных массивов идентификаторов. Каждый процесс строит его
+один раз, а затем подтягивает только изменённые рецепты: при записи
+рецепта номер версии в кэше увеличивается, и под этим номером
+сохраняются идентификаторы изменённых рецептов.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'recipes:coverage:version'
+CHANGE_KEY = 'recipes:coverage:change:{}'
+CHANGE_TIMEOUT = 24 * 60 * 60
+MAX_CHANGES_TO_APPLY = 1000
+BUILD_CHUNK_SIZE = 10000
+
+
+class IngredientCoverageIndex:
+    """Инвертированный индекс продуктов рецептов."""
+
+    def __init__(self):
+        self._postings = {}
+        self._recipes = {}
+        self.version = None
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def build(self, rows):
+        """Строит индекс с нуля по парам (рецепт, продукт)."""
+        recipes = {}
+        for recipe_id, ingredient_id in rows:
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        postings = {}
+        for recipe_id, ingredient_ids in recipes.items():
+            for ingredient_id in ingredient_ids:
+                postings.setdefault(ingredient_id, []).append(recipe_id)
+        self._recipes = {
+            recipe_id: array('q', sorted(ingredient_ids))
+            for recipe_id, ingredient_ids in recipes.items()
+        }
+        self._postings = {
+            ingredient_id: array('q', sorted(recipe_ids))
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.built_at = time.monotonic()
+
+    def remove_recipe(self, recipe_id):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            posting = self._postings[ingredient_id]
+            position = bisect_left(posting, recipe_id)
+            if position < len(posting) and posting[position] == recipe_id:
+                del posting[position]
+            if not posting:
+                del self._postings[ingredient_id]
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """Заменяет продукты рецепта (пустой список удаляет рецепт)."""
+        self.remove_recipe(recipe_id)
+        if not ingredient_ids:
+            return
+        self._recipes[recipe_id] = array('q', sorted(ingredient_ids))
+        for ingredient_id in ingredient_ids:
+            insort(
+                self._postings.setdefault(ingredient_id, array('q')),
+                recipe_id
+            )
+
+    def query(self, ingredient_ids, max_missing=None, exclude=()):
+        """Возвращает список (рецепт, найдено, не хватает).
+
+        Рецепты упорядочены по числу найденных продуктов, затем по числу
+        недостающих и от новых к старым.
+        """
+        # recipe_changed меняет индекс под той же блокировкой.
+        with self.lock:
+            covered = Counter()
+            for ingredient_id in set(ingredient_ids):
+                covered.update(self._postings.get(ingredient_id, ()))
+            excluded = set()
+            for ingredient_id in set(exclude):
+                excluded.update(self._postings.get(ingredient_id, ()))
+
+            matches = []
+            for recipe_id, count in covered.items():
+                if recipe_id in excluded:
+                    continue
+                missing = len(self._recipes[recipe_id]) - count
+                if max_missing is not None and missing > max_missing:
+                    continue
+                matches.append((recipe_id, count, missing))
+        matches.sort(key=lambda match: (-match[1], match[2], -match[0]))
+        return matches
+
+
+coverage_index = IngredientCoverageIndex()
+
+
+def _current_version():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    return cache.get(VERSION_KEY, 0)
+
+
+def _load_rows(recipe_ids=None):
+    # Модуль импортируется из models.py ради обработчика recipe_deleted.
+    from .models import RecipeIngredient
+
+    rows = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id')
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    return rows.iterator(chunk_size=BUILD_CHUNK_SIZE)
+
+
+def _apply_changes(index, version):
+    """Применяет журнал изменений, если он сохранился целиком."""
+    if index.version is None or version < index.version:
+        return False
+    if version - index.version > MAX_CHANGES_TO_APPLY:
+        return False
+    keys = [
+        CHANGE_KEY.format(number)
+        for number in range(index.version + 1, version + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return False
+    recipe_ids = set().union(*changes.values())
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in _load_rows(recipe_ids):
+        ingredients[recipe_id].append(ingredient_id)
+    for recipe_id, ingredient_ids in ingredients.items():
+        index.set_recipe(recipe_id, ingredient_ids)
+    return True
+
+
+def get_coverage_index():
+    """Возвращает актуальный индекс текущего процесса."""
+    index = coverage_index
+    version = _current_version()
+    with index.lock:
+        expired = index.built_at is None or (
+            time.monotonic() - index.built_at > settings.COVERAGE_INDEX_TTL
+        )
+        if expired or not (
+            version == index.version or _apply_changes(index, version)
+        ):
+            index.build(_load_rows())
+        index.version = version
+    return index
+
+
+def recipes_changed(recipe_ids):
+    """Сообщает всем процессам, что продукты рецептов изменились.
+
+    Вызывается после фиксации транзакции, чтобы другие процессы
+    прочитали уже сохранённые данные.
+    """
+    recipe_ids = list(recipe_ids)
+    _current_version()
+    version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), recipe_ids, timeout=CHANGE_TIMEOUT)
+    index = coverage_index
+    with index.lock:
+        if index.version == version - 1:
+            ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+            for recipe_id, ingredient_id in _load_rows(recipe_ids):
+                ingredients[recipe_id].append(ingredient_id)
+            for recipe_id, ingredient_ids in ingredients.items():
+                index.set_recipe(recipe_id, ingredient_ids)
+            index.version = version
+
+
+def recipe_changed(recipe_id):
+    """Сообщает всем процессам, что продукты рецепта изменились."""
+    recipes_changed([recipe_id])
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    """Обработчик post_delete рецепта, в том числе каскадного."""
+    transaction.on_commit(partial(recipe_changed, instance.pk))
+
+
+def ingredient_deleted(sender, instance, **kwargs):
+    """Обработчик pre_delete продукта.
+
+    Продукт каскадно удаляется из рецептов, поэтому рецепты читаются до
+    удаления и обновляются в индексе после фиксации транзакции.
+    """
+    recipe_ids = list(instance.recipe_ingredients.values_list(
+        'recipe_id', flat=True
+    ).distinct())
+    if recipe_ids:
+        transaction.on_commit(partial(recipes_changed, recipe_ids))
@@ -0,0 +1,86 @@
+"""Кэш страницы рецепта.
+
+Кэшируется общий для всех пользователей документ рецепта; флаги
+текущего пользователя подставляются при каждом ответе. Ключ документа
+содержит версию рецепта, которая меняется при любом сохранении или
+удалении рецепта, при изменении профиля автора и продуктов рецепта,
+поэтому старые документы просто перестают читаться и истекают сами.
+"""
+import hashlib
+from functools import partial
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'recipes:detail:version:{}'
+DOCUMENT_KEY = 'recipes:detail:{}:{}:{}'
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def _version(recipe_id):
+    key = VERSION_KEY.format(recipe_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def document_key(recipe_id, base_url):
+    """Ключ документа; base_url учитывает схему и хост абсолютных URL."""
+    return DOCUMENT_KEY.format(
+        recipe_id,
+        _version(recipe_id),
+        hashlib.md5(base_url.encode()).hexdigest()
+    )
+
+
+def set_document(key, data):
+    """Сохраняет документ, очищенный от флагов пользователя."""
+    document = {**data, **dict.fromkeys(USER_FLAGS, False)}
+    document['author'] = {**data['author'], 'is_subscribed': False}
+    cache.set(key, document, settings.RECIPE_DETAIL_CACHE_TIMEOUT)
+
+
+def apply_user_flags(document, is_favorited, is_in_shopping_cart,
+                     is_subscribed):
+    """Копия документа с флагами текущего пользователя."""
+    return {
+        **document,
+        'author': {**document['author'], 'is_subscribed': is_subscribed},
+        'is_favorited': is_favorited,
+        'is_in_shopping_cart': is_in_shopping_cart,
+    }
+
+
+def invalidate(recipe_ids):
+    """Меняет версии рецептов; вызывать после фиксации транзакции."""
+    cache.set_many(
+        {
+            VERSION_KEY.format(recipe_id): uuid4().hex
+            for recipe_id in recipe_ids
+        },
+        timeout=None
+    )
+
+
+def recipe_saved(sender, instance, **kwargs):
+    """Обработчик post_save и post_delete рецепта."""
+    transaction.on_commit(partial(invalidate, [instance.pk]))
+
+
+def ingredient_changed(sender, instance, created=False, **kwargs):
+    """Обработчик post_save и pre_delete продукта.
+
+    Документы рецептов содержат название и единицу измерения продукта.
+    При удалении рецепты читаются до каскадного удаления их продуктов.
+    """
+    if created:
+        return
+    recipe_ids = list(instance.recipe_ingredients.values_list(
+        'recipe_id', flat=True
+    ).distinct())
+    if recipe_ids:
+        transaction.on_commit(partial(invalidate, recipe_ids))
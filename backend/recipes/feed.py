@@ -0,0 +1,165 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Новый рецепт сразу раскладывается по лентам подписчиков (fan-out on
+write). Для авторов с очень большим числом подписчиков это слишком
+дорого, поэтому их рецепты подмешиваются в ленту при чтении. Когда
+автор перестаёт быть таким, его последние рецепты добавляются в ленты
+подписчиков, иначе они пропали бы из лент.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from jobs.tasks import enqueue, task
+from users.models import Follow
+from .models import FeedEntry, Recipe
+
+POPULAR_AUTHORS_KEY = 'recipes:feed:popular_authors'
+POPULAR_AUTHORS_TIMEOUT = 5 * 60
+# Множество с прошлого пересчёта, без срока хранения
+PREVIOUS_POPULAR_AUTHORS_KEY = 'recipes:feed:popular_authors:previous'
+FANOUT_BATCH_SIZE = 1000
+
+
+def popular_author_ids():
+    """Авторы, чьи рецепты не раскладываются по лентам подписчиков."""
+    author_ids = cache.get(POPULAR_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.values('author').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.FEED_FANOUT_LIMIT
+            ).values_list('author', flat=True)
+        )
+        cache.set(POPULAR_AUTHORS_KEY, author_ids, POPULAR_AUTHORS_TIMEOUT)
+        previous = cache.get(PREVIOUS_POPULAR_AUTHORS_KEY, frozenset())
+        cache.set(PREVIOUS_POPULAR_AUTHORS_KEY, author_ids, timeout=None)
+        for author_id in previous - author_ids:
+            enqueue(backfill_followers, author_id)
+    return author_ids
+
+
+@task
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.only('author_id', 'pub_date').filter(
+        pk=recipe_id
+    ).first()
+    # Рецепт могли удалить, пока задача ждала в очереди.
+    if recipe is None or recipe.author_id in popular_author_ids():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(FeedEntry(
+            user_id=follower_id,
+            recipe_id=recipe.id,
+            author_id=recipe.author_id,
+            pub_date=recipe.pub_date,
+        ))
+        if len(batch) == FANOUT_BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    _insert(batch)
+
+
+def _insert(entries):
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    for entry in entries:
+        trim(entry.user_id)
+
+
+def trim(user_id):
+    """Оставляет в ленте только FEED_MAX_LENGTH свежих записей."""
+    max_length = settings.FEED_MAX_LENGTH
+    boundary = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe_id'
+    ).values_list('pub_date', 'recipe_id')[max_length:max_length + 1]
+    if not boundary:
+        return
+    pub_date, recipe_id = boundary[0]
+    FeedEntry.objects.filter(
+        user_id=user_id, pub_date__lte=pub_date
+    ).exclude(
+        pub_date=pub_date, recipe_id__gt=recipe_id
+    ).delete()
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними рецептами нового автора."""
+    if author_id not in popular_author_ids():
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL_SIZE]
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes
+            ],
+            ignore_conflicts=True
+        )
+    trim(user_id)
+
+
+@task
+def backfill_followers(author_id):
+    """Заполняет ленты подписчиков автора, рецепты которого больше не
+    подмешиваются при чтении."""
+    follower_ids = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        backfill(user_id, author_id)
+
+
+def unsubscribe(user_id, author_id):
+    """Убирает из ленты рецепты автора, от которого отписались."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    trim(user_id)
+
+
+def _before(queryset, position, pub_date_field, id_field):
+    if position is None:
+        return queryset
+    pub_date, recipe_id = position
+    return queryset.filter(
+        **{f'{pub_date_field}__lte': pub_date}
+    ).exclude(
+        **{pub_date_field: pub_date, f'{id_field}__gte': recipe_id}
+    )
+
+
+def get_feed(user_id, position, limit):
+    """Возвращает позиции (дата, рецепт) страницы ленты.
+
+    Список содержит не больше limit + 1 элементов: лишний элемент
+    означает, что в ленте есть следующая страница.
+    """
+    entries = _before(
+        FeedEntry.objects.filter(user_id=user_id),
+        position, 'pub_date', 'recipe_id'
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit + 1]
+    page = set(entries)
+
+    popular_ids = popular_author_ids()
+    if popular_ids:
+        followed = Follow.objects.filter(
+            user_id=user_id, author_id__in=popular_ids
+        ).values_list('author_id', flat=True)
+        recipes = _before(
+            Recipe.objects.filter(author_id__in=followed),
+            position, 'pub_date', 'id'
+        ).order_by('-pub_date', '-id').values_list('pub_date', 'id')
+        page.update(recipes[:limit + 1])
+
+    return sorted(page, reverse=True)[:limit + 1]
@@ -0,0 +1,79 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from recipes.coverage import IngredientCoverageIndex
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет построение индекса продуктов и поиск по нему '
+        'на синтетических данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=10)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--pantry-size', type=int, default=15)
+        parser.add_argument('--max-missing', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _rows(self, rows, ingredients, per_recipe, rng):
+        """Популярность продуктов распределена по закону Ципфа."""
+        weights = [1 / rank for rank in ingredients]
+        for recipe_id in range(1, rows // per_recipe + 1):
+            ingredient_ids = set(rng.choices(
+                ingredients, weights=weights, k=per_recipe
+            ))
+            for ingredient_id in ingredient_ids:
+                yield recipe_id, ingredient_id
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredients = range(1, options['ingredients'] + 1)
+        rows = list(self._rows(
+            options['rows'], ingredients, options['per_recipe'], rng
+        ))
+
+        index = IngredientCoverageIndex()
+        tracemalloc.start()
+        started = time.perf_counter()
+        index.build(rows)
+        build_time = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        weights = [1 / rank for rank in ingredients]
+        timings = []
+        matches_count = 0
+        for _ in range(options['queries']):
+            pantry = rng.choices(
+                ingredients, weights=weights, k=options['pantry_size'])
+            exclude = [rng.choice(ingredients)]
+            started = time.perf_counter()
+            matches = index.query(
+                pantry, max_missing=options['max_missing'], exclude=exclude)
+            timings.append(time.perf_counter() - started)
+            matches_count += len(matches)
+
+        started = time.perf_counter()
+        for recipe_id in range(1, 1001):
+            index.set_recipe(recipe_id, rng.sample(ingredients, 10))
+        update_time = (time.perf_counter() - started) / 1000
+
+        timings.sort()
+        self.stdout.write(
+            f'Строк рецепт-продукт: {len(rows)}\n'
+            f'Рецептов в индексе: {len(index)}\n'
+            f'Построение индекса: {build_time:.2f} с, '
+            f'пик памяти {peak_memory / 2 ** 20:.1f} МБ\n'
+            f'Поиск: p50 {statistics.median(timings) * 1000:.2f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} мс, '
+            f'в среднем найдено {matches_count // len(timings)} рецептов\n'
+            f'Обновление рецепта: {update_time * 1000:.3f} мс'
+        )
@@ -0,0 +1,52 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import similar_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и память расчёта похожих рецептов '
+        'на синтетическом избранном'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--favorites', type=int, default=5_000_000)
+        parser.add_argument('--users', type=int, default=500_000)
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        user_ids = rng.integers(
+            1, options['users'] + 1, size=options['favorites'])
+        recipe_ids = rng.zipf(1.3, size=options['favorites'])
+        recipe_ids = recipe_ids[recipe_ids <= options['recipes']]
+        user_ids = user_ids[:len(recipe_ids)]
+        pairs = np.unique(np.stack([user_ids, recipe_ids], axis=1), axis=0)
+        user_ids, recipe_ids = pairs[:, 0], pairs[:, 1]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        recipes_count = 0
+        neighbours_count = 0
+        for _, similar in similar_recipes(
+            user_ids, recipe_ids, top_k=options['top_k']
+        ):
+            recipes_count += 1
+            neighbours_count += len(similar)
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f'Записей избранного: {len(user_ids)}\n'
+            f'Рецептов: {recipes_count}, '
+            f'соседей: {neighbours_count}\n'
+            f'Время: {elapsed:.1f} с\n'
+            f'Пик памяти: {peak_memory / 2 ** 20:.1f} МБ'
+        )
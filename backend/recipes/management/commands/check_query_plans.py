@@ -0,0 +1,316 @@
+import json
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    User,
+)
+from users.models import Follow
+
+SEEDED_TABLES = (
+    User._meta.db_table,
+    Follow._meta.db_table,
+    Ingredient._meta.db_table,
+    Recipe._meta.db_table,
+    RecipeIngredient._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+)
+PREFIX = 'plancheck'
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def plan_lines(plan, depth=0):
+    yield (
+        f'{"  " * depth}{plan["Node Type"]}'
+        + (f' on {plan["Relation Name"]}' if 'Relation Name' in plan else '')
+        + (f' using {plan["Index Name"]}' if 'Index Name' in plan else '')
+    )
+    for child in plan.get('Plans', ()):
+        yield from plan_lines(child, depth + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет планы запросов API и админки на синтетических данных '
+        'PostgreSQL: падает, если вместо индекса в плане полное '
+        'сканирование таблицы или сортировка'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help='множитель объёма данных: 2000 пользователей и 20000 '
+                 'рецептов на единицу'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='печатать планы и для прошедших проверок'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL.')
+        # Данные создаются в транзакции и откатываются вместе с ней.
+        with transaction.atomic():
+            fixtures = self._seed(
+                options['scale'], random.Random(options['seed'])
+            )
+            with connection.cursor() as cursor:
+                for table in SEEDED_TABLES:
+                    cursor.execute(f'ANALYZE {table}')
+            failures = self._check(fixtures, options['verbose_plans'])
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f'Планы без нужного индекса: {failures}.')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
+
+    def _seed(self, scale, rng):
+        users = User.objects.bulk_create(
+            User(
+                username=f'{PREFIX}{number}',
+                email=f'{PREFIX}{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='!',
+            )
+            for number in range(2000 * scale)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(
+                name=f'{PREFIX} {rng.choice("абвгдежзиклмнопрст")}{number}',
+                measurement_unit='г',
+            )
+            for number in range(5000)
+        )
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=rng.choice(users),
+                    name=f'{PREFIX} {number}',
+                    text='Описание',
+                    cooking_time=rng.randint(1, 180),
+                    image='recipes/images/plancheck.png',
+                )
+                for number in range(20000 * scale)
+            ),
+            batch_size=5000
+        )
+        # bulk_create ставит всем рецептам одну дату публикации.
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(minutes=recipe.id)
+        Recipe.objects.bulk_update(recipes, ['pub_date'], batch_size=5000)
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient in rng.sample(ingredients, 5)
+            ),
+            batch_size=5000
+        )
+        for model, per_user in ((Favorite, 20), (ShoppingCart, 5)):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in rng.sample(recipes, per_user)
+                ),
+                batch_size=5000
+            )
+        Follow.objects.bulk_create(
+            (
+                Follow(user=user, author=author)
+                for user in users
+                for author in rng.sample(users, 10)
+                if author != user
+            ),
+            batch_size=5000
+        )
+        return {
+            'user': users[0],
+            'author': recipes[0].author,
+            'recipe': recipes[0],
+            'recipe_ids': [recipe.id for recipe in recipes[:6]],
+        }
+
+    def _shapes(self, fixtures):
+        """Запросы из api/views.py, api/filters.py, лент и админки.
+
+        Для каждого: имя, запрос, таблицы, которые нельзя читать целиком,
+        и допустима ли сортировка в плане.
+        """
+        user = fixtures['user']
+        author = fixtures['author']
+        recipe = fixtures['recipe']
+        recipe_ids = fixtures['recipe_ids']
+        recipes = Recipe._meta.db_table
+        users = User._meta.db_table
+        return (
+            (
+                'список рецептов',
+                Recipe.objects.select_related('author')[:6],
+                {recipes}, False,
+            ),
+            (
+                'рецепты автора',
+                Recipe.objects.filter(author=author)[:6],
+                {recipes}, False,
+            ),
+            (
+                'лента: рецепты популярных авторов',
+                Recipe.objects.filter(
+                    author_id__in=[author.id]
+                ).order_by('-pub_date', '-id').values_list(
+                    'pub_date', 'id'
+                )[:7],
+                {recipes}, False,
+            ),
+            (
+                'отметки рецепта',
+                Recipe.objects.filter(pk=recipe.pk).values_list(
+                    Exists(Favorite.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )),
+                    Exists(ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )),
+                    Exists(Follow.objects.filter(
+                        user=user, author=OuterRef('author')
+                    )),
+                ),
+                {
+                    recipes, Favorite._meta.db_table,
+                    ShoppingCart._meta.db_table, Follow._meta.db_table,
+                },
+                # first() сортирует одну найденную по ключу строку.
+                True,
+            ),
+            (
+                'отметки страницы рецептов',
+                Favorite.objects.filter(
+                    user=user, recipe_id__in=recipe_ids
+                ).values_list('recipe_id', flat=True),
+                {Favorite._meta.db_table}, False,
+            ),
+            (
+                'избранное пользователя (is_favorited)',
+                Recipe.objects.filter(favorite__user=user)[:6],
+                {recipes, Favorite._meta.db_table}, True,
+            ),
+            (
+                'не в избранном (is_favorited=False)',
+                # exclude() превращается в NOT IN с подзапросом.
+                Recipe.objects.exclude(favorite__user=user)[:6],
+                {Favorite._meta.db_table}, True,
+            ),
+            (
+                'удаление рецепта: избранное',
+                Favorite.objects.filter(recipe_id__in=recipe_ids),
+                {Favorite._meta.db_table}, True,
+            ),
+            (
+                'удаление рецепта: список покупок',
+                ShoppingCart.objects.filter(recipe_id__in=recipe_ids),
+                {ShoppingCart._meta.db_table}, True,
+            ),
+            (
+                'ингредиенты страницы рецептов',
+                RecipeIngredient.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).select_related('ingredient'),
+                {RecipeIngredient._meta.db_table}, True,
+            ),
+            (
+                'поиск ингредиента по началу названия',
+                Ingredient.objects.filter(name__istartswith=f'{PREFIX} а1'),
+                {Ingredient._meta.db_table}, True,
+            ),
+            (
+                'подписчики автора',
+                Follow.objects.filter(author=author).values_list(
+                    'user_id', flat=True
+                ),
+                {Follow._meta.db_table}, True,
+            ),
+            (
+                'is_subscribed',
+                # Так выглядит запрос exists().
+                Follow.objects.filter(user=user, author=author).order_by()[:1],
+                {Follow._meta.db_table}, False,
+            ),
+            (
+                'подписки пользователя',
+                User.objects.filter(author_subscriptions__user=user),
+                {Follow._meta.db_table}, True,
+            ),
+            (
+                'список пользователей',
+                User.objects.all()[:6],
+                {users}, False,
+            ),
+            (
+                'админка: ингредиенты с числом рецептов',
+                Ingredient.objects.annotate(
+                    recipes_count=Count('recipe_ingredients', distinct=True)
+                ).order_by('name')[:100],
+                {RecipeIngredient._meta.db_table}, True,
+            ),
+            (
+                'админка: пользователи с числом рецептов и подписок',
+                User.objects.annotate(
+                    recipes_count=Count('recipes', distinct=True),
+                    subscriptions_count=Count('subscriptions', distinct=True),
+                    followers_count=Count(
+                        'author_subscriptions', distinct=True
+                    ),
+                ).order_by('-date_joined', '-pk')[:100],
+                {recipes, Follow._meta.db_table}, True,
+            ),
+        )
+
+    def _check(self, fixtures, verbose):
+        failures = 0
+        for name, queryset, tables, sort_allowed in self._shapes(fixtures):
+            plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+            problems = [
+                f'{node["Node Type"]} on {node["Relation Name"]}'
+                for node in plan_nodes(plan)
+                if node['Node Type'] == 'Seq Scan'
+                and node['Relation Name'] in tables
+            ]
+            if not sort_allowed:
+                problems.extend(
+                    node['Node Type'] for node in plan_nodes(plan)
+                    if node['Node Type'] in ('Sort', 'Incremental Sort')
+                )
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(
+                    f'FAIL  {name}: {", ".join(problems)}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'ok    {name}'))
+            if problems or verbose:
+                for line in plan_lines(plan):
+                    self.stdout.write(f'        {line}')
+        return failures
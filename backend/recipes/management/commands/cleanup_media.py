@@ -0,0 +1,144 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, StoredFile
+from recipes.storage import content_storage
+
+User = get_user_model()
+
+# Поля, файлы которых хранятся в MEDIA_ROOT
+FILE_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def scan_files(root):
+    """Обходит каталог потоком, не собирая список файлов в памяти."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT файлы картинок рецептов и аватаров, '
+        'на которые не ссылается ни одна запись'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Не трогать файлы моложе указанного числа часов'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество файлов, проверяемых за один запрос'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Не больше указанного числа удалений в секунду'
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.min_age = options['min_age'] * 60 * 60
+        self.rate = options['rate']
+        self.scanned = self.orphaned = self.deleted = self.freed = 0
+
+        location = content_storage.location
+        directories = {
+            model._meta.get_field(name).upload_to.strip('/')
+            for model, name in FILE_FIELDS
+        }
+        for directory in sorted(directories):
+            batch = {}
+            for entry in scan_files(os.path.join(location, directory)):
+                self.scanned += 1
+                name = os.path.relpath(entry.path, location).replace(
+                    os.sep, '/'
+                )
+                batch[name] = entry
+                if len(batch) == options['batch_size']:
+                    self._process(batch)
+                    batch = {}
+            if batch:
+                self._process(batch)
+
+        if self.dry_run:
+            result = f'Будет удалено файлов: {self.orphaned}'
+        else:
+            result = f'Удалено файлов: {self.deleted}'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {self.scanned}. {result}, '
+            f'{self.freed / 1024 / 1024:.1f} МБ'
+        ))
+
+    def _referenced(self, names):
+        referenced = set(StoredFile.objects.filter(
+            name__in=names, refcount__gt=0
+        ).values_list('name', flat=True))
+        for model, field in FILE_FIELDS:
+            referenced.update(model.objects.filter(
+                **{f'{field}__in': names}
+            ).values_list(field, flat=True))
+        return referenced
+
+    def _process(self, batch):
+        cutoff = time.time() - self.min_age
+        candidates = [
+            name for name, entry in batch.items()
+            if entry.stat(follow_symlinks=False).st_mtime < cutoff
+        ]
+        if not candidates:
+            return
+        orphans = set(candidates) - self._referenced(candidates)
+        for name in sorted(orphans):
+            path = batch[name].path
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # Хранилище обновляет время изменения файла при повторной
+            # загрузке того же содержимого.
+            if stat.st_mtime >= cutoff:
+                continue
+            self.orphaned += 1
+            self.freed += stat.st_size
+            if self.dry_run:
+                self.stdout.write(name)
+                continue
+            started = time.monotonic()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.deleted += 1
+            if self.rate:
+                time.sleep(max(
+                    1 / self.rate - (time.monotonic() - started), 0
+                ))
+        if not self.dry_run:
+            StoredFile.objects.filter(
+                name__in=orphans, refcount__lte=0
+            ).delete()
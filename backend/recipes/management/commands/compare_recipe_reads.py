@@ -0,0 +1,172 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.representations import RecipeRepresentation
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+
+User = get_user_model()
+
+# Варианты ?fields= и ?expand=, на которых сравниваются ответы
+QUERIES = (
+    '',
+    'fields=id,name,image,cooking_time,is_favorited,is_in_shopping_cart',
+    'fields=id,author,ingredients',
+    'fields=author,ingredients,text&expand=author,ingredients',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ответы списка и страницы рецепта через сериализаторы '
+        'и быстрое представление; с --benchmark замеряет производительность'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, от имени которого идут запросы; '
+                 'по умолчанию проверяются аноним и первый пользователь'
+        )
+        parser.add_argument('--host', default=None)
+        parser.add_argument(
+            '--query', action='append',
+            help='параметры запроса для сравнения, например fields=id,name'
+        )
+        parser.add_argument(
+            '--self-check', action='store_true',
+            help='убедиться, что сравнение замечает испорченный быстрый '
+                 'путь списка и страницы рецепта'
+        )
+        parser.add_argument(
+            '--benchmark', type=int, default=0, metavar='REQUESTS',
+            help='число запросов списка для замера на каждом пути'
+        )
+
+    def handle(self, *args, **options):
+        self.factory = APIRequestFactory()
+        self.host = options['host'] or next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost'
+        ).lstrip('.')
+        self.list_view = RecipeViewSet.as_view({'get': 'list'})
+        self.detail_view = RecipeViewSet.as_view({'get': 'retrieve'})
+
+        if options['user']:
+            users = [User.objects.get(pk=options['user'])]
+        else:
+            users = [None, User.objects.order_by('id').first()]
+
+        recipe_ids = Recipe.objects.values_list('id', flat=True)[
+            :options['pages'] * options['limit']
+        ]
+        if options['self_check']:
+            self._self_check(recipe_ids.first(), users[-1])
+        checked = 0
+        for query in options['query'] or QUERIES:
+            for user in users:
+                for page in range(1, options['pages'] + 1):
+                    path = (
+                        f'/api/recipes/?page={page}'
+                        f'&limit={options["limit"]}&{query}'
+                    )
+                    if not self._compare(self.list_view, path, user):
+                        break
+                    checked += 1
+                for recipe_id in recipe_ids:
+                    self._compare(
+                        self.detail_view,
+                        f'/api/recipes/{recipe_id}/?{query}', user,
+                        pk=str(recipe_id)
+                    )
+                    checked += 1
+        self.stdout.write(f'Ответы совпадают: {checked}')
+
+        if options['benchmark']:
+            for query in options['query'] or QUERIES:
+                path = f'/api/recipes/?limit={options["limit"]}&{query}'
+                self.stdout.write(query or 'все поля')
+                for fast in (False, True):
+                    self._benchmark(
+                        path, users[-1], fast, options['benchmark']
+                    )
+
+    def _get(self, view, path, user, fast, **kwargs):
+        request = self.factory.get(path, HTTP_HOST=self.host)
+        if user is not None:
+            force_authenticate(request, user=user)
+        # Без кэша страницы рецепта: иначе второй путь отдал бы документ,
+        # сохранённый первым.
+        with override_settings(
+            FAST_RECIPE_READS=fast, RECIPE_DETAIL_CACHE_TIMEOUT=0
+        ):
+            response = view(request, **kwargs)
+            response.render()
+        return response
+
+    def _compare(self, view, path, user, **kwargs):
+        """Сравнивает ответы двух путей; False, если страница пуста."""
+        expected = self._get(view, path, user, False, **kwargs)
+        actual = self._get(view, path, user, True, **kwargs)
+        if (
+            expected.status_code != actual.status_code
+            or expected.content != actual.content
+        ):
+            raise CommandError(
+                f'Ответы различаются: {path} (пользователь {user}):\n'
+                f'{expected.status_code} {expected.content!r}\n'
+                f'{actual.status_code} {actual.content!r}'
+            )
+        return expected.status_code == 200
+
+    def _self_check(self, recipe_id, user):
+        """Сравнение с испорченным быстрым путём должно завершиться ошибкой."""
+        if recipe_id is None:
+            raise CommandError('Для проверки нужен хотя бы один рецепт.')
+        represent = RecipeRepresentation.represent
+
+        def broken(representation, rows):
+            recipes = represent(representation, rows)
+            for recipe in recipes:
+                recipe['name'] = f'{recipe.get("name")}!'
+            return recipes
+
+        checks = (
+            (self.list_view, '/api/recipes/?page=1&limit=1', {}),
+            (
+                self.detail_view, f'/api/recipes/{recipe_id}/',
+                {'pk': str(recipe_id)}
+            ),
+        )
+        with mock.patch.object(RecipeRepresentation, 'represent', broken):
+            for view, path, kwargs in checks:
+                try:
+                    self._compare(view, path, user, **kwargs)
+                except CommandError:
+                    continue
+                raise CommandError(
+                    f'Испорченный быстрый путь не замечен: {path}'
+                )
+        self.stdout.write('Испорченный быстрый путь замечен.')
+
+    def _benchmark(self, path, user, fast, requests):
+        with CaptureQueriesContext(connection) as queries:
+            self._get(self.list_view, path, user, fast)
+        started = time.process_time()
+        for _ in range(requests):
+            self._get(self.list_view, path, user, fast)
+        elapsed = time.process_time() - started
+        self.stdout.write(
+            f'{"быстрый" if fast else "сериализаторы"}: '
+            f'{requests / elapsed:.0f} запросов/с на ядро, '
+            f'{len(queries)} запросов к базе на страницу'
+        )
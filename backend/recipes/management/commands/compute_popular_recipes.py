@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import PopularRecipe
+from recipes.popularity import update_popular_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных рецептов. '
+        'Предназначена для запуска по расписанию (например, из cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window',
+            choices=PopularRecipe.Window.values,
+            action='append',
+            help='Окно рейтинга; по умолчанию пересчитываются все'
+        )
+
+    def handle(self, *args, **options):
+        for window in options['window'] or PopularRecipe.Window.values:
+            count = update_popular_recipes(window)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Рейтинг «{PopularRecipe.Window(window).label}» '
+                    f'обновлён: {count} рецептов'
+                )
+            )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import SimilarRecipe
+from recipes.recommendations import (
+    affected_recipes,
+    load_favorites,
+    save_similar_recipes,
+    similar_recipes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассчитывает рекомендации «с этим рецептом также сохраняют» '
+        'по таблице избранного'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Пересчитать только рецепты, затронутые новым избранным'
+        )
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument(
+            '--min-support',
+            type=int,
+            default=1,
+            help='Минимальное число пользователей, сохранивших оба рецепта'
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        targets = None
+        if options['incremental']:
+            since = SimilarRecipe.objects.aggregate(
+                since=Max('computed_at'))['since']
+            if since is not None:
+                targets = affected_recipes(since)
+
+        user_ids, recipe_ids = load_favorites()
+        neighbours = similar_recipes(
+            user_ids,
+            recipe_ids,
+            targets=targets,
+            top_k=options['top_k'],
+            min_support=options['min_support'],
+        )
+        saved = save_similar_recipes(
+            neighbours, started, replace_all=targets is None)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Рекомендации обновлены для {saved} рецептов '
+                f'(записей избранного: {len(user_ids)}, '
+                f'{(timezone.now() - started).total_seconds():.1f} с)'
+            )
+        )
@@ -3,6 +3,7 @@ import os
 
 from django.core.management.base import BaseCommand
 
+from api.catalogue import build_snapshot
 from recipes.models import Ingredient
 
 
@@ -29,12 +30,14 @@ class Command(BaseCommand):
                 )
                 created_count = len(created_ingredients)
                 existing_count = len(ingredients_data) - created_count
+                snapshot = build_snapshot()
 
                 self.stdout.write(
                     self.style.SUCCESS(
                         f'Загрузка завершена успешно!\n'
                         f'Создано новых ингредиентов: {created_count}\n'
-                        f'Пропущено существующих: {existing_count}'
+                        f'Пропущено существующих: {existing_count}\n'
+                        f'Снимок справочника: {snapshot.digest}'
                     )
                 )
 
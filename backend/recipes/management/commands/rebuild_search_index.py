@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import clear_index, index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, индексируемых за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        clear_index()
+        recipe_ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True)
+        batch = []
+        indexed_count = 0
+        for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+            batch.append(recipe_id)
+            if len(batch) == batch_size:
+                with transaction.atomic():
+                    index_recipes(batch)
+                indexed_count += len(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                index_recipes(batch)
+            indexed_count += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Поисковый индекс пересобран. '
+                f'Проиндексировано рецептов: {indexed_count}'
+            )
+        )
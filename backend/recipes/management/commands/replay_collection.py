@@ -0,0 +1,518 @@
+import http.client
+import json
+import re
+import subprocess
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http import HTTPStatus
+from urllib.parse import quote, urlsplit
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+User = get_user_model()
+
+DEFAULT_COLLECTION = (
+    settings.BASE_DIR.parent / 'postman_collection'
+    / 'foodgram.postman_collection.json'
+)
+VARIABLE = re.compile(r'{{\s*([\w.-]+)\s*}}')
+# Разбор тестов коллекции: ожидаемый статус и сохраняемые переменные
+EXPECTED_STATUS = re.compile(
+    r'pm\.response\.status\s*,[^)]*\)\s*\.to\.be\.eql\(\s*["\']([^"\']+)'
+)
+LOCAL = re.compile(
+    r'(?:const|let|var)\s+(\w+)\s*=\s*_\.get\(\s*responseData\s*,'
+    r'\s*["\']([\w.]+)["\']\s*\)'
+)
+SET_VARIABLE = re.compile(
+    r'pm\.collectionVariables\.set\(\s*["\'](\w+)["\']\s*,\s*(.+?)\s*\)\s*;?'
+    r'\s*$'
+)
+RESPONSE_PATH = re.compile(
+    r'^responseData((?:\[\d+\]|\.\w+)*?)'
+    r'(?:\.slice\(\s*(\d+)\s*,\s*(\d+)\s*\))?$'
+)
+PATH_PART = re.compile(r'\[(\d+)\]|\.(\w+)')
+STATUS_CODES = {status.phrase: status.value for status in HTTPStatus}
+# Переменные с логинами и почтой получают суффикс прохода, чтобы
+# повторная регистрация не упиралась в уже созданных пользователей.
+UNIQUE_VARIABLE = re.compile(r'^(?!tooLong).*(?:username|email)$', re.I)
+PERCENTILES = (50, 95, 99)
+URL_SAFE = "/?&=%:@!$'()*+,;~"
+
+
+def percentile(values, percent):
+    """Перцентиль с линейной интерполяцией по отсортированному списку."""
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    summary = {
+        f'p{percent}': percentile(latencies, percent)
+        for percent in PERCENTILES
+    }
+    if latencies:
+        summary.update(
+            min=latencies[0],
+            mean=sum(latencies) / len(latencies),
+            max=latencies[-1],
+        )
+    return {key: round(value, 3) for key, value in summary.items()
+            if value is not None}
+
+
+def resolve(text, variables):
+    """Подставляет {{переменные}}; неизвестные остаются как есть."""
+    return VARIABLE.sub(
+        lambda match: str(variables.get(match[1], match[0])), text
+    )
+
+
+def response_value(data, expression, local_paths):
+    """Значение выражения из теста коллекции для тела ответа."""
+    if expression in local_paths:
+        expression = 'responseData.' + local_paths[expression]
+    match = RESPONSE_PATH.match(expression)
+    if match is None:
+        return None
+    value = data
+    for index, key in PATH_PART.findall(match[1]):
+        try:
+            value = value[int(index)] if index else value[key]
+        except (IndexError, KeyError, TypeError):
+            return None
+    if match[2] is not None and isinstance(value, str):
+        value = value[int(match[2]):int(match[3])]
+    return value
+
+
+class Step:
+    """Запрос коллекции с правилами проверки и сохранения переменных."""
+
+    def __init__(self, name, request, auth, script):
+        self.name = name
+        self.method = request['method']
+        url = request['url']
+        self.url = url['raw'] if isinstance(url, dict) else url
+        self.headers = [
+            (header['key'], header['value'])
+            for header in request.get('header', [])
+            if not header.get('disabled')
+        ]
+        body = request.get('body') or {}
+        self.body = body.get('raw') if body.get('mode') == 'raw' else None
+        language = body.get('options', {}).get('raw', {}).get('language')
+        if self.body is not None and language == 'json':
+            self.headers.append(('Content-Type', 'application/json'))
+        if auth and auth.get('type') == 'apikey':
+            options = {item['key']: item['value'] for item in auth['apikey']}
+            if options.get('in', 'header') == 'header':
+                self.headers.append((options['key'], options['value']))
+
+        expected = EXPECTED_STATUS.search(script)
+        self.expected_status = (
+            STATUS_CODES.get(expected[1]) if expected else None
+        )
+        self.local_paths = dict(LOCAL.findall(script))
+        self.extract = [
+            match.groups() for match in map(
+                SET_VARIABLE.search, script.splitlines()
+            ) if match
+        ]
+
+    def is_error(self, status):
+        if self.expected_status is None:
+            return status >= 500
+        return status != self.expected_status
+
+    def save_variables(self, content, variables):
+        if not self.extract:
+            return
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return
+        for name, expression in self.extract:
+            value = response_value(data, expression, self.local_paths)
+            # В тестах коллекции переменная сохраняется только
+            # при непустом значении.
+            if value:
+                variables[name] = value
+
+
+def collect_steps(items, path=(), auth=None):
+    for item in items:
+        item_auth = item.get('auth', auth)
+        name = path + (item['name'],)
+        if 'item' in item:
+            yield from collect_steps(item['item'], name, item_auth)
+            continue
+        request = item['request']
+        script = '\n'.join(
+            line
+            for event in item.get('event', [])
+            if event['listen'] == 'test'
+            for line in event['script']['exec']
+        )
+        yield Step(
+            ' / '.join(name), request, request.get('auth', item_auth), script
+        )
+
+
+class InProcessTransport:
+    """Запросы к приложению Django в том же процессе."""
+
+    def __init__(self, host):
+        self.client = Client(SERVER_NAME=host, raise_request_exception=False)
+
+    def new_client(self, address):
+        self.client.defaults['REMOTE_ADDR'] = address
+
+    def send(self, method, url, headers, body):
+        url = urlsplit(url)
+        path = url.path + (f'?{url.query}' if url.query else '')
+        headers = dict(headers)
+        content_type = headers.pop('Content-Type', 'application/json')
+        response = self.client.generic(
+            method, path, body or '', content_type=content_type,
+            headers=headers
+        )
+        return response.status_code, response.getvalue()
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Запросы к серверу по HTTP с постоянным соединением."""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.connect = lambda: connection_class(url.netloc, timeout=timeout)
+        self.connection = self.connect()
+
+    def new_client(self, address):
+        self.connection.close()
+
+    def send(self, method, url, headers, body):
+        url = urlsplit(url)
+        # Postman сам кодирует кириллицу в URL, http.client — нет.
+        path = quote(
+            url.path + (f'?{url.query}' if url.query else ''),
+            safe=URL_SAFE
+        )
+        body = body.encode() if body is not None else None
+        for attempt in range(2):
+            try:
+                self.connection.request(
+                    method, path, body=body, headers=dict(headers)
+                )
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError,
+                    ConnectionResetError):
+                # Сервер закрыл соединение между запросами.
+                self.connection.close()
+                self.connection = self.connect()
+                if attempt:
+                    raise
+
+    def close(self):
+        self.connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон postman-коллекции: каждый виртуальный '
+        'пользователь выполняет запросы коллекции по порядку, результат — '
+        'перцентили задержки, пропускная способность и доля ошибок в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collection', default=str(DEFAULT_COLLECTION),
+            help='путь к postman-коллекции'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='адрес запущенного сервера, например http://127.0.0.1:8000;'
+                 ' по умолчанию запросы идут в приложение в этом процессе'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='число одновременно работающих виртуальных пользователей'
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=5,
+            help='сколько раз каждый виртуальный пользователь проходит '
+                 'коллекцию'
+        )
+        parser.add_argument(
+            '--folder', action='append',
+            help='выполнять только запросы из папки с таким именем; '
+                 'папки с регистрацией и получением токенов нужны '
+                 'остальным запросам'
+        )
+        parser.add_argument(
+            '--exclude', action='append', default=[],
+            help='пропускать запросы, в пути которых есть эта строка'
+        )
+        parser.add_argument(
+            '--var', action='append', default=[], metavar='NAME=VALUE',
+            help='значение переменной коллекции'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--output', help='файл для результата в JSON; по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='JSON предыдущего прогона для сравнения перцентилей'
+        )
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='удалить из базы пользователей, созданных прогоном'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['collection'], encoding='utf-8') as file:
+                collection = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать коллекцию: {error}')
+
+        steps = list(collect_steps(collection['item']))
+        if options['folder']:
+            steps = [
+                step for step in steps
+                if set(options['folder']) & set(step.name.split(' / ')[:-1])
+            ]
+        steps = [
+            step for step in steps
+            if not any(text in step.name for text in options['exclude'])
+        ]
+        if not steps:
+            raise CommandError('Не выбрано ни одного запроса.')
+
+        variables = {
+            variable['key']: variable.get('value', '')
+            for variable in collection.get('variable', [])
+        }
+        for assignment in options['var']:
+            name, _, value = assignment.partition('=')
+            variables[name] = value
+        if options['base_url']:
+            variables['baseUrl'] = options['base_url'].rstrip('/')
+        self.options = options
+        self.steps = steps
+        self.variables = variables
+        self.run_id = uuid4().hex[:6]
+
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                self._virtual_user, range(options['concurrency'])
+            ))
+        duration = time.perf_counter() - started
+
+        report = self._report(
+            [sample for samples in results for sample in samples],
+            duration, started_at
+        )
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(
+                username__contains=f'-{self.run_id}-'
+            ).delete()
+            self.stderr.write(f'Удалено записей: {deleted}')
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        self._print_summary(report)
+        if options['compare']:
+            self._print_comparison(report, options['compare'])
+
+    def _unique_variables(self, suffix):
+        variables = dict(self.variables)
+        for name, value in self.variables.items():
+            if not UNIQUE_VARIABLE.match(name):
+                continue
+            # Значения в коллекции записаны как JSON-строки в кавычках.
+            quoted = value.startswith('"')
+            text = json.loads(value) if quoted else value
+            local, at, domain = text.partition('@')
+            text = f'{local}+{suffix}@{domain}' if at else f'{text}-{suffix}'
+            variables[name] = json.dumps(text) if quoted else text
+        return variables
+
+    def _virtual_user(self, number):
+        if self.options['base_url']:
+            transport = HTTPTransport(
+                self.options['base_url'], self.options['timeout']
+            )
+        else:
+            host = next(
+                (host for host in settings.ALLOWED_HOSTS if host != '*'),
+                'localhost'
+            ).lstrip('.')
+            transport = InProcessTransport(host)
+        samples = []
+        try:
+            for iteration in range(self.options['iterations']):
+                # Каждый проход — новый клиент со своими пользователями
+                # и адресом: ограничения частоты для анонимов считаются
+                # по адресу из X-Forwarded-For. За nginx адрес всех
+                # клиентов один — адрес машины, с которой идёт прогон.
+                client = number * self.options['iterations'] + iteration
+                address = (
+                    f'10.{client // 65536 % 256}.{client // 256 % 256}.'
+                    f'{client % 256}'
+                )
+                transport.new_client(address)
+                variables = self._unique_variables(
+                    f'{self.run_id}-{number}-{iteration}'
+                )
+                for step in self.steps:
+                    samples.append(
+                        self._send(transport, step, variables, address)
+                    )
+        finally:
+            transport.close()
+        return samples
+
+    def _send(self, transport, step, variables, address):
+        url = resolve(step.url, variables)
+        headers = [
+            (name, resolve(value, variables)) for name, value in step.headers
+        ] + [('X-Forwarded-For', address)]
+        body = resolve(step.body, variables) if step.body else step.body
+        started = time.perf_counter()
+        try:
+            status, content = transport.send(step.method, url, headers, body)
+        except (OSError, http.client.HTTPException) as error:
+            latency = (time.perf_counter() - started) * 1000
+            return step.name, None, True, latency, type(error).__name__
+        latency = (time.perf_counter() - started) * 1000
+        step.save_variables(content, variables)
+        return step.name, status, step.is_error(status), latency, None
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def _report(self, samples, duration, started_at):
+        by_name = defaultdict(list)
+        for sample in samples:
+            by_name[sample[0]].append(sample)
+        requests = {}
+        for step in self.steps:
+            if step.name in requests:
+                continue
+            step_samples = by_name[step.name]
+            statuses = defaultdict(int)
+            for _, status, _, _, error in step_samples:
+                statuses[str(status or error)] += 1
+            errors = sum(sample[2] for sample in step_samples)
+            requests[step.name] = {
+                'method': step.method,
+                'expected_status': step.expected_status,
+                'count': len(step_samples),
+                'errors': errors,
+                'error_rate': round(errors / len(step_samples), 4),
+                'statuses': dict(statuses),
+                'latency_ms': latency_summary(
+                    sample[3] for sample in step_samples
+                ),
+            }
+        errors = sum(sample[2] for sample in samples)
+        return {
+            'commit': self._git_commit(),
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'target': self.options['base_url'] or 'in-process',
+            'concurrency': self.options['concurrency'],
+            'iterations': self.options['iterations'],
+            'duration_s': round(duration, 3),
+            'count': len(samples),
+            'errors': errors,
+            'error_rate': round(errors / len(samples), 4),
+            'throughput_rps': round(len(samples) / duration, 2),
+            'latency_ms': latency_summary(sample[3] for sample in samples),
+            'requests': requests,
+        }
+
+    def _print_summary(self, report):
+        latency = report['latency_ms']
+        self.stderr.write(
+            f'{report["count"]} запросов за {report["duration_s"]} с, '
+            f'{report["throughput_rps"]} запросов/с, ошибок '
+            f'{report["errors"]} ({report["error_rate"]:.1%}); '
+            f'p50 {latency["p50"]:.1f} мс, p95 {latency["p95"]:.1f} мс, '
+            f'p99 {latency["p99"]:.1f} мс'
+        )
+        for name, stats in report['requests'].items():
+            if stats['errors']:
+                self.stderr.write(self.style.WARNING(
+                    f'{name}: ошибок {stats["errors"]} из {stats["count"]}, '
+                    f'ожидался {stats["expected_status"]}, '
+                    f'получено {stats["statuses"]}'
+                ))
+
+    def _print_comparison(self, report, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        rows = [('всего', baseline['latency_ms'], report['latency_ms'])]
+        rows += [
+            (name, baseline['requests'][name]['latency_ms'],
+             stats['latency_ms'])
+            for name, stats in report['requests'].items()
+            if name in baseline.get('requests', {})
+        ]
+        self.stderr.write(
+            f'Сравнение с {baseline.get("commit") or path} '
+            f'(p50 / p95 / p99, мс):'
+        )
+        for name, before, after in rows:
+            changes = []
+            for key in (f'p{percent}' for percent in PERCENTILES):
+                if key not in before or key not in after:
+                    continue
+                change = (
+                    (after[key] - before[key]) / before[key]
+                    if before[key] else 0
+                )
+                changes.append(
+                    f'{before[key]:.1f} → {after[key]:.1f} ({change:+.0%})'
+                )
+            self.stderr.write(f'{name}: ' + ' / '.join(changes))
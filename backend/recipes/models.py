@@ -1,6 +1,15 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from .coverage import ingredient_deleted, recipe_deleted
+from .detail_cache import ingredient_changed, recipe_saved
+from .storage import (
+    FileReferencesMixin,
+    content_storage,
+    release_deleted_files
+)
 
 User = get_user_model()
 
@@ -24,14 +33,20 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(FileReferencesMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        verbose_name='Автор'
+        verbose_name='Автор',
+        # Поиск по автору обслуживает recipe_author_pub_date_idx
+        db_index=False
     )
     name = models.CharField('Название', max_length=256)
-    image = models.ImageField('Картинка', upload_to='recipes/')
+    image = models.ImageField(
+        'Картинка',
+        upload_to='recipes/',
+        storage=content_storage
+    )
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -45,11 +60,23 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
 
+    file_fields = ('image',)
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -74,6 +101,7 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Продукт в рецепте'
         verbose_name_plural = 'Продукты в рецептах'
+        ordering = ('id',)
         default_related_name = 'recipe_ingredients'
         constraints = [
             models.UniqueConstraint(
@@ -94,8 +122,11 @@ class BaseUserRecipeRelation(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        verbose_name='Рецепт'
+        verbose_name='Рецепт',
+        # Поиск по рецепту обслуживает индекс (recipe, user)
+        db_index=False
     )
+    created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -106,6 +137,16 @@ class BaseUserRecipeRelation(models.Model):
                 name='unique_%(class)s'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                name='%(class)s_created_at_idx'
+            ),
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
@@ -125,3 +166,153 @@ class ShoppingCart(BaseUserRecipeRelation):
     class Meta(BaseUserRecipeRelation.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class PopularRecipe(models.Model):
+    """Предрассчитанный рейтинг популярных рецептов."""
+
+    class Window(models.TextChoices):
+        DAY = 'day', 'За день'
+        WEEK = 'week', 'За неделю'
+        ALL = 'all', 'За всё время'
+
+    window = models.CharField(
+        'Период',
+        max_length=8,
+        choices=Window.choices
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField('Рейтинг')
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ('window', '-score')
+        default_related_name = 'popularity'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['window', 'recipe'],
+                name='unique_popular_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['window', '-score'],
+                name='popular_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.window}: {self.recipe.name}'
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, который часто добавляют в избранное вместе с данным."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+    computed_at = models.DateTimeField('Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe.name} -> {self.similar.name}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        default_related_name = 'feed_entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_keyset_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class StoredFile(models.Model):
+    """Число ссылок на файл хранилища с адресацией по содержимому."""
+
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    refcount = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+post_delete.connect(release_deleted_files, sender=Recipe)
+post_save.connect(recipe_saved, sender=Recipe)
+post_delete.connect(recipe_saved, sender=Recipe)
+post_delete.connect(recipe_deleted, sender=Recipe)
+post_save.connect(ingredient_changed, sender=Ingredient)
+pre_delete.connect(ingredient_changed, sender=Ingredient)
+pre_delete.connect(ingredient_deleted, sender=Ingredient)
@@ -0,0 +1,87 @@
+"""Рейтинг популярных рецептов по избранному и спискам покупок.
+
+Каждое добавление рецепта даёт вклад, который убывает вдвое за период
+полураспада окна. Агрегация по часам выполняется в базе, а сюда
+приходит поток отсортированных по рецепту строк, поэтому память не
+зависит от числа записей: держится только текущая верхушка рейтинга.
+"""
+import heapq
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Favorite, PopularRecipe, ShoppingCart
+
+ACTIVITY_WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 0.5),
+)
+
+# Окно: (глубина, период полураспада)
+WINDOWS = {
+    PopularRecipe.Window.DAY: (timedelta(days=1), timedelta(hours=6)),
+    PopularRecipe.Window.WEEK: (timedelta(days=7), timedelta(days=1)),
+    PopularRecipe.Window.ALL: (None, None),
+}
+CHUNK_SIZE = 5000
+
+
+def _activity(model, weight, since):
+    """Поток (рецепт, вес, начало часа) по одной модели активности."""
+    rows = model.objects.all()
+    fields = ['recipe_id']
+    if since is not None:
+        rows = rows.filter(created_at__gte=since).annotate(
+            bucket=TruncHour('created_at')
+        )
+        fields.append('bucket')
+    rows = rows.values(*fields).annotate(
+        count=Count('id')
+    ).order_by(*fields).values_list('recipe_id', 'count', *fields[1:])
+    for recipe_id, count, *bucket in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield recipe_id, weight * count, bucket[0] if bucket else None
+
+
+def score_recipes(window, now=None, limit=None):
+    """Возвращает [(рейтинг, рецепт)] лучших рецептов окна."""
+    now = now or timezone.now()
+    limit = limit or settings.POPULAR_RECIPES_LIMIT
+    depth, half_life = WINDOWS[window]
+    since = now - depth if depth else None
+    streams = [
+        _activity(model, weight, since)
+        for model, weight in ACTIVITY_WEIGHTS
+    ]
+
+    top = []
+    rows = heapq.merge(*streams, key=itemgetter(0))
+    for recipe_id, activity in groupby(rows, key=itemgetter(0)):
+        score = 0.0
+        for _, weight, bucket in activity:
+            if half_life is not None:
+                age = max(now - bucket - timedelta(minutes=30), timedelta())
+                weight *= 0.5 ** (age / half_life)
+            score += weight
+        if len(top) < limit:
+            heapq.heappush(top, (score, recipe_id))
+        elif score > top[0][0]:
+            heapq.heapreplace(top, (score, recipe_id))
+    return sorted(top, reverse=True)
+
+
+def update_popular_recipes(window, now=None):
+    """Пересчитывает рейтинг окна и атомарно заменяет его в таблице."""
+    top = score_recipes(window, now=now)
+    with transaction.atomic():
+        PopularRecipe.objects.filter(window=window).delete()
+        PopularRecipe.objects.bulk_create([
+            PopularRecipe(window=window, recipe_id=recipe_id, score=score)
+            for score, recipe_id in top
+        ])
+    return len(top)
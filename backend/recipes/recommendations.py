@@ -0,0 +1,136 @@
+"""Рекомендации «с этим рецептом также сохраняют».
+
+Избранное представляется разреженной матрицей пользователь × рецепт.
+Совместная встречаемость считается произведением X^T X блоками строк
+и нормируется по популярности (косинусная мера), после чего для
+каждого рецепта остаются K ближайших соседей.
+
+Модуль импортирует NumPy и SciPy, поэтому используется только из
+команд управления, а не из веб-процессов.
+"""
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .models import Favorite, SimilarRecipe
+
+CHUNK_SIZE = 100_000
+BLOCK_SIZE = 2000
+WRITE_BATCH_SIZE = 5000
+
+
+def load_favorites(favorites=None):
+    """Читает пары (пользователь, рецепт) потоком в массивы NumPy."""
+    if favorites is None:
+        favorites = Favorite.objects.all()
+    pairs = favorites.values_list('user_id', 'recipe_id').order_by()
+    chunks = []
+    chunk = []
+    for pair in pairs.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(pair)
+        if len(chunk) == CHUNK_SIZE:
+            chunks.append(np.array(chunk, dtype=np.int64))
+            chunk = []
+    if chunk:
+        chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.concatenate(chunks)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def similar_recipes(user_ids, recipe_ids, targets=None, top_k=10,
+                    min_support=1):
+    """Возвращает (рецепт, [(похожий рецепт, сходство)]).
+
+    targets ограничивает набор рецептов, для которых ищутся соседи;
+    по умолчанию обрабатываются все рецепты.
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    recipes, recipe_index = np.unique(recipe_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(user_index), dtype=np.float32),
+            (user_index, recipe_index),
+        ),
+        shape=(len(users), len(recipes)),
+    )
+    popularity = np.asarray(matrix.sum(axis=0)).ravel()
+    norms = np.sqrt(popularity)
+    transposed = matrix.T.tocsr()
+
+    if targets is None:
+        rows = np.arange(len(recipes))
+    else:
+        rows = np.flatnonzero(np.isin(recipes, np.asarray(list(targets))))
+
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        cooccurrence = (transposed[block] @ matrix).tocsr()
+        cooccurrence.eliminate_zeros()
+        for position, row in enumerate(block):
+            begin, end = cooccurrence.indptr[position:position + 2]
+            columns = cooccurrence.indices[begin:end]
+            counts = cooccurrence.data[begin:end]
+            keep = (columns != row) & (counts >= min_support)
+            columns, counts = columns[keep], counts[keep]
+            if not len(columns):
+                yield int(recipes[row]), []
+                continue
+            scores = counts / (norms[row] * norms[columns])
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield int(recipes[row]), [
+                (int(recipes[column]), float(score))
+                for column, score in zip(columns[order], scores[order])
+            ]
+
+
+def affected_recipes(since):
+    """Рецепты, чьи соседи могли измениться после since."""
+    users = Favorite.objects.filter(created_at__gte=since).values('user_id')
+    return set(
+        Favorite.objects.filter(user_id__in=users).values_list(
+            'recipe_id', flat=True
+        ).distinct()
+    )
+
+
+def save_similar_recipes(neighbours, computed_at, replace_all=False):
+    """Заменяет соседей рецептов в таблице порциями.
+
+    При replace_all удаляются и записи рецептов, которых не оказалось
+    в расчёте (например, их убрали из избранного все пользователи).
+    """
+    saved = 0
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe_id__in=[recipe_id for recipe_id, _ in batch]
+            ).delete()
+            SimilarRecipe.objects.bulk_create([
+                SimilarRecipe(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score,
+                    computed_at=computed_at,
+                )
+                for recipe_id, similar in batch
+                for similar_id, score in similar
+            ])
+
+    for recipe_id, similar in neighbours:
+        batch.append((recipe_id, similar))
+        saved += 1
+        if len(batch) == WRITE_BATCH_SIZE:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    if replace_all:
+        SimilarRecipe.objects.filter(computed_at__lt=computed_at).delete()
+    return saved
@@ -0,0 +1,100 @@
+"""Добавление в избранное, список покупок и подписки одним запросом.
+
+На PostgreSQL проверка существования цели, вставка с ON CONFLICT DO
+NOTHING и чтение данных для ответа выполняются одним оператором,
+поэтому одновременные повторные запросы не приводят к IntegrityError.
+На других СУБД используется эквивалентная последовательность запросов
+ORM.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+
+from users.models import Follow
+from .models import Recipe
+
+User = get_user_model()
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def add_recipe(model, user_id, recipe_id):
+    """Добавляет рецепт в избранное или список покупок.
+
+    Возвращает (рецепт с полями для краткого ответа, добавлен ли он
+    сейчас) или (None, False), если рецепта нет.
+    """
+    if connection.vendor != 'postgresql':
+        recipe = Recipe.objects.only(*RECIPE_FIELDS).filter(
+            pk=recipe_id
+        ).first()
+        if recipe is None:
+            return None, False
+        try:
+            with transaction.atomic():
+                model.objects.create(user_id=user_id, recipe_id=recipe_id)
+        except IntegrityError:
+            return recipe, False
+        return recipe, True
+
+    columns = ', '.join(f'r.{_quote(name)}' for name in RECIPE_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH r AS (SELECT {columns} FROM '
+            f'{_quote(Recipe._meta.db_table)} r WHERE r.id = %s), '
+            f'added AS (INSERT INTO {_quote(model._meta.db_table)} '
+            f'(user_id, recipe_id, created_at) '
+            f'SELECT %s, r.id, now() FROM r '
+            f'ON CONFLICT DO NOTHING RETURNING recipe_id) '
+            f'SELECT {columns}, EXISTS (SELECT 1 FROM added) FROM r',
+            [recipe_id, user_id]
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None, False
+    *values, created = row
+    return Recipe(**dict(zip(RECIPE_FIELDS, values))), created
+
+
+def add_follow(user_id, author_id):
+    """Подписывает пользователя на автора.
+
+    Возвращает (существует ли автор, создана ли подписка сейчас).
+    """
+    if connection.vendor != 'postgresql':
+        if not User.objects.filter(pk=author_id).exists():
+            return False, False
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user_id=user_id, author_id=author_id)
+        except IntegrityError:
+            return True, False
+        return True, True
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH a AS (SELECT id FROM {_quote(User._meta.db_table)} '
+            f'WHERE id = %s), '
+            f'added AS (INSERT INTO {_quote(Follow._meta.db_table)} '
+            f'(user_id, author_id) SELECT %s, a.id FROM a '
+            f'ON CONFLICT DO NOTHING RETURNING id) '
+            f'SELECT EXISTS (SELECT 1 FROM added) FROM a',
+            [author_id, user_id]
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return False, False
+    return True, row[0]
+
+
+def remove(queryset):
+    """Удаляет записи и возвращает их число.
+
+    У избранного, списка покупок и подписок нет зависимых записей,
+    поэтому QuerySet.delete() удаляет их одним DELETE без выборки;
+    обработчики удаления, если их подключат, при этом вызываются.
+    """
+    return queryset.delete()[0]
@@ -0,0 +1,125 @@
+"""Полнотекстовый поиск по рецептам.
+
+На PostgreSQL поисковый вектор хранится в колонке ``search_vector``
+таблицы рецептов (конфигурация ``russian``, GIN-индекс), на SQLite -
+в теневой таблице FTS5. Колонка и таблица создаются миграцией и
+не описаны в модели, поэтому ORM о них не знает.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL, Value
+
+from jobs.tasks import task
+from .models import Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('{config}', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('{config}', coalesce(text, '')), 'B')"
+).format(config=SEARCH_CONFIG)
+
+
+def _vendor():
+    return connection.vendor
+
+
+def _recipe_column(column):
+    quote = connection.ops.quote_name
+    return f'{quote(Recipe._meta.db_table)}.{quote(column)}'
+
+
+def _fts_query(query):
+    """Превращает пользовательский ввод в безопасный запрос FTS5."""
+    terms = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+@task
+def index_recipes(recipe_ids):
+    """Пересчитывает поисковый индекс для указанных рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    table = Recipe._meta.db_table
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        if _vendor() == 'postgresql':
+            cursor.execute(
+                f'UPDATE {table} SET search_vector = {POSTGRES_VECTOR} '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+        elif _vendor() == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {table} '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    """Обработчик post_delete рецепта: удаляет его строку FTS5.
+
+    Строка удаляется в той же транзакции, что и рецепт. На PostgreSQL
+    вектор хранится в строке рецепта и удаляется вместе с ней.
+    """
+    if _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [instance.pk]
+            )
+
+
+def clear_index():
+    """Удаляет записи теневой таблицы (нужно перед полной пересборкой)."""
+    if _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+
+def search_recipes(recipes, query):
+    """Фильтрует рецепты по запросу и сортирует их по релевантности."""
+    vendor = _vendor()
+    if vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s, %s)'
+        params = [SEARCH_CONFIG, query]
+        vector = _recipe_column('search_vector')
+        match = RawSQL(
+            f'{vector} @@ {tsquery}', params, output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'ts_rank({vector}, {tsquery})', params, output_field=FloatField()
+        )
+    elif vendor == 'sqlite':
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return recipes.none()
+        recipe_id = _recipe_column('id')
+        match = RawSQL(
+            f'{recipe_id} IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)',
+            [fts_query],
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {recipe_id})',
+            [fts_query],
+            output_field=FloatField()
+        )
+    else:
+        return recipes.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return recipes.filter(match).annotate(search_rank=rank).order_by(
+        '-search_rank', '-pub_date'
+    )
@@ -0,0 +1,192 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 его содержимого, поэтому
+одинаковые загрузки дают один файл, а содержимое по имени никогда не
+меняется и может кэшироваться браузерами навсегда. Число ссылок на
+файл из полей моделей хранится в StoredFile; файл удаляется после
+фиксации транзакции, в которой исчезла последняя ссылка.
+"""
+import hashlib
+import os
+import posixpath
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с именами вида recipes/ab/abcd….png."""
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от удаления
+            # командой cleanup_media, пока на него появляется ссылка.
+            os.utime(self.path(name))
+            return name
+        self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        saved = self._save(name, content)
+        if saved != name:
+            # Тот же файл одновременно записал другой процесс.
+            self.delete(saved)
+
+    def restore(self, name, content):
+        """Записывает файл заново, если его удалили до взятия ссылки.
+
+        save() возвращает имя уже существующего файла, а ссылку модель
+        берёт позже. В этом промежутке _delete_if_unused другого запроса
+        может удалить файл без ссылок. После acquire() файл больше не
+        удаляется, поэтому достаточно проверить его наличие после неё.
+        """
+        if self.exists(name):
+            return
+        content.seek(0)
+        self._write(name, content)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def _file_model():
+    # Модель импортируется при вызове: хранилище создаётся раньше, чем
+    # загружаются приложения.
+    from .models import StoredFile
+    return StoredFile
+
+
+def acquire(name):
+    """Добавляет ссылку на файл."""
+    StoredFile = _file_model()
+    if StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    ):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(
+            refcount=F('refcount') + 1
+        )
+
+
+def _delete_if_unused(name):
+    StoredFile = _file_model()
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(
+            name=name
+        ).first()
+        if stored is not None and stored.refcount > 0:
+            return
+        content_storage.delete(name)
+        if stored is not None:
+            stored.delete()
+
+
+def release(name):
+    """Убирает ссылку на файл; последняя ссылка удаляет файл.
+
+    Файлы, загруженные до подсчёта ссылок, записей не имеют и
+    удаляются сразу: раньше каждая загрузка получала своё имя.
+    """
+    _file_model().objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1
+    )
+    transaction.on_commit(partial(_delete_if_unused, name))
+
+
+class FileReferencesMixin:
+    """Учитывает ссылки на файлы полей file_fields модели.
+
+    Имена файлов запоминаются при загрузке из базы, поэтому при
+    сохранении изменения видны без дополнительного запроса. Удаление
+    объекта, в том числе каскадное, обрабатывает release_deleted_files,
+    подключённый к post_delete модели.
+    """
+
+    file_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        deferred = instance.get_deferred_fields()
+        instance._loaded_files = {
+            name: instance._file_name(name)
+            for name in cls.file_fields if name not in deferred
+        }
+        return instance
+
+    def _file_name(self, name):
+        return getattr(self, name).name or ''
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        fields = [
+            name for name in self.file_fields
+            if update_fields is None or name in update_fields
+        ]
+        loaded = dict(getattr(self, '_loaded_files', {}))
+        if self._state.adding:
+            loaded = dict.fromkeys(fields, '')
+        missing = [name for name in fields if name not in loaded]
+        if missing and self.pk is not None:
+            # Поле было отложено при загрузке: прежнее имя берётся из базы.
+            loaded.update(
+                type(self)._base_manager.filter(pk=self.pk).values(
+                    *missing
+                ).first() or dict.fromkeys(missing, '')
+            )
+        # После сохранения поле хранит только имя, а содержимое новых
+        # загрузок может понадобиться storage.restore().
+        uploads = {}
+        for name in fields:
+            field_file = getattr(self, name)
+            if field_file and not field_file._committed:
+                uploads[name] = field_file.file
+        super().save(*args, **kwargs)
+        for name in fields:
+            old, new = loaded.get(name) or '', self._file_name(name)
+            if old == new:
+                continue
+            if new:
+                acquire(new)
+                if name in uploads:
+                    getattr(self, name).storage.restore(new, uploads[name])
+            if old:
+                release(old)
+        self._loaded_files = {
+            **getattr(self, '_loaded_files', {}),
+            **{name: self._file_name(name) for name in fields},
+        }
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    """Обработчик post_delete для моделей с FileReferencesMixin."""
+    deferred = instance.get_deferred_fields()
+    for name in sender.file_fields:
+        if name not in deferred and instance._file_name(name):
+            release(instance._file_name(name))
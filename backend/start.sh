@@ -17,6 +17,17 @@ python manage.py migrate --noinput
 echo "Loading ingredients data..."
 python manage.py load_ingredients
 
-# Запускаем сервер
+# Каталог метрик процессов gunicorn (api/metrics.py) очищается при запуске
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Запускаем сервер. В режиме предзагрузки приложение импортируется один
+# раз в главном процессе, а процессы-обработчики получают его при fork;
+# GUNICORN_PRELOAD=False возвращает загрузку в каждом процессе
 echo "Starting Gunicorn..."
-gunicorn foodgram_back.wsgi:application --bind 0.0.0.0:8000
+PRELOAD=
+if [ "${GUNICORN_PRELOAD:-True}" = "True" ]; then
+    PRELOAD=--preload
+fi
+gunicorn foodgram_back.wsgi:application --bind 0.0.0.0:8000 $PRELOAD
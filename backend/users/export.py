@@ -0,0 +1,185 @@
+"""Выгрузка данных пользователя одним ZIP-архивом.
+
+Архив собирается по ходу передачи: export_archive отдаёт байты по мере
+записи, не дожидаясь конца архива. Записи читаются из базы итераторами
+пачками по EXPORT_CHUNK_SIZE, файлы изображений копируются в архив
+кусками, поэтому расход памяти не зависит от числа рецептов. В архиве:
+
+    profile.json          профиль
+    recipes.json          рецепты с ингредиентами
+    favorites.json        избранное
+    shopping_cart.json    список покупок
+    subscriptions.json    подписки
+    images/…              изображения рецептов и аватар
+"""
+import io
+import json
+import posixpath
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Follow
+
+EXPORT_CHUNK_SIZE = 200
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class _Output(io.RawIOBase):
+    """Поток без перемотки, из которого забираются записанные байты.
+
+    zipfile пишет в такой поток записи с дескрипторами данных после
+    содержимого, не возвращаясь к заголовкам.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _dumps(value):
+    return json.dumps(
+        value, ensure_ascii=False, indent=2, cls=DjangoJSONEncoder
+    ).encode()
+
+
+def _archive_name(name):
+    return posixpath.join('images', name)
+
+
+def _image_name(field):
+    return _archive_name(field.name) if field else None
+
+
+def _profile(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'date_joined': user.date_joined,
+        'avatar': _image_name(user.avatar),
+    }
+
+
+def _recipes(user):
+    ingredients = RecipeIngredient.objects.select_related('ingredient')
+    recipes = Recipe.objects.filter(author=user).prefetch_related(
+        Prefetch('recipe_ingredients', queryset=ingredients)
+    ).order_by('pub_date', 'id')
+    for recipe in recipes.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'id': recipe.id,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date,
+            'image': _image_name(recipe.image),
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe_ingredients.all()
+            ],
+        }
+
+
+def _relations(model, user):
+    rows = model.objects.filter(user=user).order_by('created_at').values(
+        'recipe_id', 'recipe__name', 'created_at'
+    )
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'recipe': row['recipe_id'],
+            'name': row['recipe__name'],
+            'added_at': row['created_at'],
+        }
+
+
+def _subscriptions(user):
+    rows = Follow.objects.filter(user=user).order_by('id').values(
+        'author_id', 'author__username'
+    )
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'id': row['author_id'], 'username': row['author__username']}
+
+
+def _write_list(archive, output, name, items):
+    """Массив JSON, записываемый в архив по одному элементу."""
+    with archive.open(name, 'w') as entry:
+        entry.write(b'[')
+        for number, item in enumerate(items):
+            entry.write(b',\n' if number else b'\n')
+            entry.write(_dumps(item))
+            yield output.take()
+        entry.write(b'\n]\n')
+    yield output.take()
+
+
+def _recipe_images(user):
+    """Имена изображений рецептов: одно изображение может быть у многих."""
+    names = Recipe.objects.filter(author=user).exclude(image='').order_by(
+        'image'
+    ).values_list('image', flat=True).distinct()
+    return names.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _write_file(archive, output, storage, name):
+    info = zipfile.ZipInfo(_archive_name(name))
+    # Изображения уже сжаты.
+    info.compress_type = zipfile.ZIP_STORED
+    try:
+        source = storage.open(name, 'rb')
+    except FileNotFoundError:
+        return
+    with source, archive.open(info, 'w') as entry:
+        for chunk in source.chunks(FILE_CHUNK_SIZE):
+            entry.write(chunk)
+            yield output.take()
+    yield output.take()
+
+
+def _chunks(user):
+    output = _Output()
+    with zipfile.ZipFile(
+        output, 'w', compression=zipfile.ZIP_DEFLATED
+    ) as archive:
+        archive.writestr('profile.json', _dumps(_profile(user)))
+        yield output.take()
+        for name, items in (
+            ('recipes.json', _recipes(user)),
+            ('favorites.json', _relations(Favorite, user)),
+            ('shopping_cart.json', _relations(ShoppingCart, user)),
+            ('subscriptions.json', _subscriptions(user)),
+        ):
+            yield from _write_list(archive, output, name, items)
+        if user.avatar:
+            yield from _write_file(
+                archive, output, user.avatar.storage, user.avatar.name
+            )
+        storage = Recipe._meta.get_field('image').storage
+        for name in _recipe_images(user):
+            yield from _write_file(archive, output, storage, name)
+    yield output.take()
+
+
+def export_archive(user):
+    """Куски ZIP-архива с данными пользователя."""
+    # Сжатие копит данные, и часть записей в архив ничего не выводит.
+    return (chunk for chunk in _chunks(user) if chunk)
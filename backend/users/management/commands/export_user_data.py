@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from users.export import export_archive
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Выгружает данные пользователя в ZIP-архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='id, ник или email пользователя')
+        parser.add_argument(
+            '--output', default='-',
+            help='файл архива, «-» — стандартный вывод'
+        )
+
+    def handle(self, *args, **options):
+        lookup = options['user']
+        query = Q(username=lookup) | Q(email__iexact=lookup)
+        if lookup.isdigit():
+            query |= Q(pk=int(lookup))
+        users = list(User.objects.filter(query)[:2])
+        if len(users) != 1:
+            raise CommandError(
+                f'Пользователь {lookup} не найден.' if not users
+                else f'Под {lookup} подходят несколько пользователей.'
+            )
+        user, = users
+
+        if options['output'] == '-':
+            self._write(user, sys.stdout.buffer)
+            return
+        try:
+            with open(options['output'], 'wb') as file:
+                size = self._write(user, file)
+        except OSError as error:
+            raise CommandError(
+                f'Не удалось записать {options["output"]}: {error}'
+            )
+        self.stderr.write(
+            f'{options["output"]}: {size / 2 ** 20:.1f} МБ'
+        )
+
+    def _write(self, user, file):
+        size = 0
+        for chunk in export_archive(user):
+            file.write(chunk)
+            size += len(chunk)
+        file.flush()
+        return size
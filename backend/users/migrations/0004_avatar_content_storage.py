@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:01
+
+import django.core.validators
+import recipes.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_follow_options_alter_user_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='users/avatars/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'], message='Поддерживаются только форматы JPG и PNG.')], verbose_name='Аватар'),
+        ),
+    ]
@@ -1,9 +1,19 @@
+from functools import partial
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
 from django.core.validators import FileExtensionValidator, RegexValidator
 
+from recipes.detail_cache import invalidate as invalidate_recipes
+from recipes.storage import (
+    FileReferencesMixin,
+    content_storage,
+    release_deleted_files
+)
+
 
-class User(AbstractUser):
+class User(FileReferencesMixin, AbstractUser):
     username = models.CharField(
         'Ник',
         max_length=150,
@@ -30,6 +40,7 @@ class User(AbstractUser):
     avatar = models.ImageField(
         'Аватар',
         upload_to='users/avatars/',
+        storage=content_storage,
         blank=True,
         null=True,
         validators=[
@@ -43,28 +54,38 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
+    file_fields = ('avatar',)
+    # Поля, которые попадают в документы рецептов автора
+    author_fields = frozenset(
+        ('email', 'username', 'first_name', 'last_name', 'avatar')
+    )
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('-date_joined',)
+        indexes = [
+            models.Index(
+                fields=['-date_joined'],
+                name='user_date_joined_idx'
+            )
+        ]
 
     def __str__(self):
         return self.email
 
-    def delete(self, *args, **kwargs):
-        if self.avatar:
-            self.avatar.delete(save=False)
-        super().delete(*args, **kwargs)
-
     def save(self, *args, **kwargs):
-        if self.pk:
-            try:
-                old_instance = User.objects.get(pk=self.pk)
-                if old_instance.avatar and self.avatar != old_instance.avatar:
-                    old_instance.avatar.delete(save=False)
-            except User.DoesNotExist:
-                pass
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if adding or (
+            update_fields is not None
+            and self.author_fields.isdisjoint(update_fields)
+        ):
+            return
+        recipe_ids = list(self.recipes.values_list('id', flat=True))
+        if recipe_ids:
+            transaction.on_commit(partial(invalidate_recipes, recipe_ids))
 
 
 class Follow(models.Model):
@@ -78,7 +99,9 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='author_subscriptions',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        # Поиск подписчиков автора обслуживает follow_author_user_idx
+        db_index=False
     )
 
     class Meta:
@@ -91,3 +114,12 @@ class Follow(models.Model):
                 name='unique_follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            )
+        ]
+
+
+post_delete.connect(release_deleted_files, sender=User)
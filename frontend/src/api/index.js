@@ -302,14 +302,27 @@ class Api {
   }
 
   // ingredients
+  // the full catalogue is loaded once and filtered locally
   getIngredients({ name }) {
-    const token = localStorage.getItem("token");
-    return fetch(`/api/ingredients/?name=${name}`, {
-      method: "GET",
-      headers: {
-        ...this._headers,
-      },
-    }).then(this.checkResponse);
+    if (!this._ingredients) {
+      this._ingredients = fetch(`/api/ingredients/`, {
+        method: "GET",
+        headers: {
+          ...this._headers,
+        },
+      })
+        .then(this.checkResponse)
+        .catch((err) => {
+          this._ingredients = null;
+          throw err;
+        });
+    }
+    const prefix = name.toLowerCase();
+    return this._ingredients.then((ingredients) =>
+      ingredients.filter((ingredient) =>
+        ingredient.name.toLowerCase().startsWith(prefix)
+      )
+    );
   }
 
 